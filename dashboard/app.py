@@ -5,6 +5,8 @@ from streamlit_option_menu import option_menu
 from modules import data_handler
 from pages import planejamento, acompanhamento
 
+ESTRUTURAS_PATH = data_handler.ESTRUTURAS_PATH
+
 st.set_page_config(
     page_title="Nathor | PCP Inteligente",
     page_icon="dashboard/assets/logo.png",
@@ -19,9 +21,16 @@ def load_local_css(file_path):
     except FileNotFoundError:
         st.warning(f"Arquivo CSS não encontrado em: {file_path}")
 
+@st.cache_resource
+def carregar_estruturas(path):
+    """Uma carga das estruturas por processo, compartilhada por todas as sessões e reruns."""
+    return data_handler.load_structures_store(path)
+
 # Carrega o estilo e os dados de engenharia
 load_local_css("dashboard/styles/style.css")
-st.session_state['df_estruturas'] = data_handler.load_structures_data('data/processed/Planilha_Estruturas - Produto_Cor_Dim.csv')
+st.session_state['estruturas'] = carregar_estruturas(ESTRUTURAS_PATH)
+if st.session_state['estruturas'] is None:
+    st.error(f"Arquivo de estruturas não encontrado em: {ESTRUTURAS_PATH}. Verifique o caminho no servidor.")
 
 # --- Renderização da Sidebar ---
 with st.sidebar:
@@ -60,7 +69,7 @@ if selected == "Início":
     
     st.info("Utilize o menu à esquerda para navegar entre as diferentes seções da aplicação.", icon="ℹ️")
 
-    if st.session_state['df_estruturas'] is None:
+    if st.session_state['estruturas'] is None:
         st.error("Erro Crítico: Não foi possível carregar o arquivo de estruturas de engenharia.")
 
 elif selected == "Planejamento":
@@ -0,0 +1,169 @@
+# batch.py
+"""
+Planejamento em lote, sem interface (ex.: rodada noturna do PCP).
+Otimiza vários arquivos de pedidos em paralelo e grava, para cada um, o cronograma
+e o relatório de exceções, além de um resumo geral.
+
+Uso (a partir da raiz do projeto):
+    python dashboard/batch.py pedidos/*.csv --saida data/batch/2026-10-17 --workers 4
+    python dashboard/batch.py pedidos.csv --config config.json --matriz-cor matriz_cor.csv
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+import pandas as pd
+
+from modules import data_handler, optimizer, result_cache, setup_matrix, timeline
+
+# Mesmos valores padrão da página de Planejamento
+DEFAULT_CONFIG = {
+    'horizonte_dias': 7,
+    'setup_cor': 15,
+    'setup_peca': 3,
+    'daily_capacity': 1115,
+    'tabu_tenure': 7,
+    'max_iterations': 100,
+    'max_stall_iterations': 20,
+    'max_seconds': 30,
+    'neighborhoods': ['swap', 'insertion', 'or_opt', 'two_opt'],
+    'portfolio_starts': 1,
+    'vectorized_search': True,
+    'block_compression': True,
+    'exact_max_groups': 12,
+}
+
+# Estruturas carregadas uma vez por processo de trabalho (ver `_init_worker`)
+_estruturas = None
+
+
+def _init_worker(estruturas_path):
+    global _estruturas
+    _estruturas = data_handler.load_structures_store(estruturas_path)
+
+
+def schedule_frame(cronograma, config):
+    """
+    Cronograma em uma tabela única: uma linha por lote, com o dia, a posição na sequência,
+    o setup, o início e o fim (`timeline.build_timeline`, a mesma base do Gantt).
+    """
+    df = timeline.build_timeline(cronograma, config)
+    for coluna, formato in (('Data_de_Entrega', '%d/%m/%Y'), ('Inicio', '%d/%m/%Y %H:%M'), ('Fim', '%d/%m/%Y %H:%M')):
+        if coluna in df.columns:
+            df[coluna] = pd.to_datetime(df[coluna]).dt.strftime(formato)
+    return df
+
+
+def _write_csv(df, path):
+    # Mesmo formato das exportações da interface (';' e latin1)
+    df.to_csv(path, sep=';', index=False, encoding='latin1', errors='replace')
+
+
+def plan_file(path, config, output_dir, use_cache=False):
+    """Otimiza um arquivo de pedidos e grava os resultados em `output_dir/<nome do arquivo>/`."""
+    inicio = time.monotonic()
+    df_pedidos = pd.read_csv(path, sep=',', encoding='latin1')
+    tarefas = data_handler.prepare_task_table_from_df(df_pedidos, _estruturas)
+    run = result_cache.run_full_optimization_cached if use_cache else optimizer.run_full_optimization
+    resultado = run(tarefas, config)
+    cronograma, rejeitados = resultado
+    kpis = timeline.schedule_kpis(cronograma, config)
+
+    destino = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])
+    os.makedirs(destino, exist_ok=True)
+    _write_csv(schedule_frame(cronograma, config), os.path.join(destino, 'cronograma.csv'))
+    _write_csv(pd.DataFrame(rejeitados), os.path.join(destino, 'relatorio_excecoes.csv'))
+    return {
+        'arquivo': path,
+        'lotes': len(tarefas),
+        'lotes_planejados': sum(len(day['items']) for day in cronograma),
+        'lotes_rejeitados': len(rejeitados),
+        'dias': kpis['dias'],
+        'horas_setup': round(kpis['horas_setup'], 2),
+        'horas_trabalho': round(kpis['horas_trabalho'], 2),
+        'violacoes': len(resultado.metrics.violations),
+        'segundos': round(time.monotonic() - inicio, 2),
+        'status': 'ok',
+    }
+
+
+def build_config(args):
+    """Config padrão + arquivo JSON (--config) + opções da linha de comando."""
+    config = dict(DEFAULT_CONFIG)
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            config.update(json.load(f))
+    for chave, valor in (('horizonte_dias', args.horizonte_dias), ('setup_cor', args.setup_cor),
+                         ('setup_peca', args.setup_peca), ('daily_capacity', args.capacidade),
+                         ('max_seconds', args.max_seconds)):
+        if valor is not None: config[chave] = valor
+    if args.matriz_cor: config['setup_cor_matrix'] = setup_matrix.load_setup_matrix(args.matriz_cor)
+    if args.matriz_peca: config['setup_peca_matrix'] = setup_matrix.load_setup_matrix(args.matriz_peca)
+    return config
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Planejamento em lote da linha de pintura (sem interface).")
+    parser.add_argument('pedidos', nargs='+', help="Arquivos de pedidos (.csv, mesmo formato do upload da interface)")
+    parser.add_argument('--estruturas', default=data_handler.ESTRUTURAS_PATH, help="CSV de estruturas de engenharia")
+    parser.add_argument('--saida', default=os.path.join('data', 'batch', date.today().isoformat()), help="Diretório de saída")
+    parser.add_argument('--workers', type=int, default=None, help="Processos em paralelo (padrão: um por CPU)")
+    parser.add_argument('--config', help="JSON com parâmetros do otimizador (mesmas chaves do config da interface)")
+    parser.add_argument('--horizonte-dias', type=int)
+    parser.add_argument('--setup-cor', type=float)
+    parser.add_argument('--setup-peca', type=float)
+    parser.add_argument('--capacidade', type=float, help="Capacidade diária (min)")
+    parser.add_argument('--max-seconds', type=float, help="Tempo máximo de otimização por arquivo (s)")
+    parser.add_argument('--matriz-cor', help="CSV da matriz de setup de cor (ORIGEM;DESTINO;SETUP_MIN)")
+    parser.add_argument('--matriz-peca', help="CSV da matriz de setup de peça (ORIGEM;DESTINO;SETUP_MIN)")
+    parser.add_argument('--cache', action='store_true', help="Reaproveita resultados do cache em disco do otimizador")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.estruturas):
+        print(f"Arquivo de estruturas não encontrado em: {args.estruturas}", file=sys.stderr)
+        return 2
+    config = build_config(args)
+    os.makedirs(args.saida, exist_ok=True)
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(args.pedidos)))
+
+    resumos = []
+    if workers == 1:
+        _init_worker(args.estruturas)
+        for path in args.pedidos:
+            try:
+                resumos.append(plan_file(path, config, args.saida, args.cache))
+            except Exception as e:
+                resumos.append({'arquivo': path, 'status': f'erro: {e}'})
+            print(f"{path}: {resumos[-1]['status']}")
+    else:
+        # Aquece o cache colunar das estruturas antes do pool, para os processos só o lerem
+        data_handler.load_structures_data(args.estruturas)
+        # 'spawn', como no portfólio do otimizador: processos limpos, estruturas carregadas uma vez por processo
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(args.estruturas,)) as executor:
+            futuros = {executor.submit(plan_file, path, config, args.saida, args.cache): path for path in args.pedidos}
+            for futuro in as_completed(futuros):
+                try:
+                    resumos.append(futuro.result())
+                except Exception as e:
+                    resumos.append({'arquivo': futuros[futuro], 'status': f'erro: {e}'})
+                print(f"{futuros[futuro]}: {resumos[-1]['status']}")
+
+    ordem = {path: k for k, path in enumerate(args.pedidos)}
+    resumo = pd.DataFrame(sorted(resumos, key=lambda r: ordem[r['arquivo']])).convert_dtypes()
+    _write_csv(resumo, os.path.join(args.saida, 'resumo.csv'))
+    print(resumo.to_string(index=False))
+    return 0 if (resumo['status'] == 'ok').all() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
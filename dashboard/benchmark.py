@@ -0,0 +1,194 @@
+# benchmark.py
+"""
+Benchmark de escala do planejador com dados sintéticos reprodutíveis (`modules.synthetic`).
+Para cada escala (número de lotes) mede, por estágio, o tempo de execução, o pico de
+memória (tracemalloc, em uma segunda execução) e os minutos de setup resultantes:
+  prepare_task_list       -> `prepare_task_table_from_df`
+  create_initial_schedule -> estágio 1 (após `preprocessar_pedidos`)
+  tabu_search_optimizer   -> estágio 2 com a busca tabu em todos os dias
+  create_gantt_chart      -> gráfico de Gantt (ignorado se o plotly não estiver instalado)
+Compara com a linha de base guardada e termina com código 1 se houver regressão (tempo ou
+memória acima da tolerância, ou mais minutos de setup). Tempos dependem da máquina: a linha
+de base deve ser regravada na máquina de referência.
+
+Uso (a partir da raiz do projeto):
+    python dashboard/benchmark.py                      # compara com a linha de base
+    python dashboard/benchmark.py --escalas 100,1000   # só algumas escalas
+    python dashboard/benchmark.py --salvar-baseline    # regrava a linha de base
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from modules import data_handler, optimizer, synthetic, visualization
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_SCALES = (100, 1000, 10000, 50000)
+
+# Config determinística: sem limite de tempo, busca tabu em todos os dias
+BENCHMARK_CONFIG = {
+    'horizonte_dias': 7,
+    'setup_cor': 15,
+    'setup_peca': 3,
+    'daily_capacity': 1115,
+    'tabu_tenure': 7,
+    'max_iterations': 100,
+    'max_stall_iterations': 20,
+    'neighborhoods': ['swap', 'insertion', 'or_opt', 'two_opt'],
+    'vectorized_search': True,
+    'block_compression': True,
+    'exact_max_groups': -1,
+}
+
+# Repetições dos estágios rápidos (vale o menor tempo)
+MAX_REPEATS = 10
+REPEAT_BUDGET_SECONDS = 2.0
+
+# Folgas para não acusar ruído de medição como regressão: estágios abaixo de um segundo
+# oscilam dezenas de ms entre execuções, mais que a tolerância relativa cobre
+MIN_SECONDS_SLACK = 0.25
+MIN_MEMORY_SLACK_MB = 1.0
+
+
+def measure(fn, memory=True):
+    """
+    Executa `fn` e retorna (resultado, segundos, pico de memória em MB ou None).
+    Estágios rápidos são repetidos (até MAX_REPEATS vezes ou REPEAT_BUDGET_SECONDS no
+    total) e vale o menor tempo, para reduzir o ruído de medição.
+    """
+    tempos = []
+    while len(tempos) < MAX_REPEATS and sum(tempos) < REPEAT_BUDGET_SECONDS:
+        inicio = time.perf_counter()
+        result = fn()
+        tempos.append(time.perf_counter() - inicio)
+    segundos = min(tempos)
+    pico = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            pico = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return result, segundos, pico
+
+
+def schedule_setup(days, config):
+    """Minutos de setup de um cronograma, encadeando o último item de cada dia ao seguinte."""
+    total, last_item = 0, None
+    for day in days:
+        total += optimizer.calculate_cost(day['items'], config['setup_cor'], config['setup_peca'], last_item)
+        if day['items']: last_item = day['items'][-1]
+    return total
+
+
+def run_scale(n_lots, seed=0, memory=True):
+    """Mede os estágios para uma escala; retorna {estágio: {segundos, pico_mb, setup_min}}."""
+    config = BENCHMARK_CONFIG
+    df_estruturas, df_pedidos = synthetic.generate_dataset(n_lots, seed)
+    estruturas = data_handler.StructuresStore(df_estruturas)
+    resultados = {}
+
+    def registrar(estagio, segundos, pico, setup=None):
+        resultados[estagio] = {
+            'segundos': round(segundos, 4),
+            'pico_mb': None if pico is None else round(pico, 2),
+            'setup_min': setup,
+        }
+
+    tarefas, segundos, pico = measure(lambda: data_handler.prepare_task_table_from_df(df_pedidos, estruturas), memory)
+    registrar('prepare_task_list', segundos, pico)
+
+    pedidos = optimizer.preprocessar_pedidos(tarefas)
+    (dias, _), segundos, pico = measure(lambda: optimizer.create_initial_schedule(pedidos, config), memory)
+    registrar('create_initial_schedule', segundos, pico, schedule_setup(dias, config))
+
+    cronograma, segundos, pico = measure(lambda: optimizer.sequence_schedule(dias, config), memory)
+    registrar('tabu_search_optimizer', segundos, pico, sum(day['setup_cost'] for day in cronograma))
+
+    try:
+        _, segundos, pico = measure(lambda: visualization.create_gantt_chart(cronograma, config), memory)
+        registrar('create_gantt_chart', segundos, pico)
+    except ImportError:
+        pass
+    return resultados
+
+
+def compare(resultados, baseline, tol_tempo, tol_memoria):
+    """Lista as regressões (tempo, memória ou setup pior) em relação à linha de base."""
+    regressoes = []
+    for escala, estagios in resultados.items():
+        for estagio, atual in estagios.items():
+            base = baseline.get(escala, {}).get(estagio)
+            if base is None: continue
+            limite = max(base['segundos'] * (1 + tol_tempo), base['segundos'] + MIN_SECONDS_SLACK)
+            if atual['segundos'] > limite:
+                regressoes.append(f"{escala} lotes / {estagio}: tempo {atual['segundos']:.3f}s > {limite:.3f}s")
+            if atual['pico_mb'] is not None and base['pico_mb'] is not None:
+                limite = max(base['pico_mb'] * (1 + tol_memoria), base['pico_mb'] + MIN_MEMORY_SLACK_MB)
+                if atual['pico_mb'] > limite:
+                    regressoes.append(f"{escala} lotes / {estagio}: memória {atual['pico_mb']:.1f}MB > {limite:.1f}MB")
+            if atual['setup_min'] is not None and base['setup_min'] is not None and atual['setup_min'] > base['setup_min'] + 1e-6:
+                regressoes.append(f"{escala} lotes / {estagio}: setup {atual['setup_min']} min > {base['setup_min']} min")
+    return regressoes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de escala do planejador (dados sintéticos).")
+    parser.add_argument('--escalas', default=','.join(map(str, DEFAULT_SCALES)), help="Números de lotes, separados por vírgula")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--salvar-baseline', action='store_true', help="Grava os resultados como nova linha de base")
+    parser.add_argument('--sem-memoria', action='store_true', help="Não mede o pico de memória (metade do tempo)")
+    parser.add_argument('--tolerancia-tempo', type=float, default=0.5, help="Aumento de tempo aceito (fração)")
+    parser.add_argument('--tolerancia-memoria', type=float, default=0.2, help="Aumento de memória aceito (fração)")
+    parser.add_argument('--gerar', metavar='DIR', help="Só grava os arquivos sintéticos (estruturas e pedidos) em DIR")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    escalas = [int(valor) for valor in args.escalas.split(',') if valor.strip()]
+    if args.gerar:
+        os.makedirs(args.gerar, exist_ok=True)
+        for n in escalas:
+            print(*synthetic.write_dataset(args.gerar, n, args.seed))
+        return 0
+
+    resultados = {}
+    for n in escalas:
+        resultados[str(n)] = run_scale(n, args.seed, memory=not args.sem_memoria)
+        for estagio, medida in resultados[str(n)].items():
+            print(f"{n:>7} lotes | {estagio:<24} | {medida['segundos']:>9.3f} s | "
+                  f"{medida['pico_mb'] if medida['pico_mb'] is not None else '-':>8} MB | setup {medida['setup_min']}")
+
+    if args.salvar_baseline:
+        baseline = {'python': platform.python_version(), 'machine': platform.machine(), 'seed': args.seed, 'resultados': resultados}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"Linha de base gravada em {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"Linha de base não encontrada em {args.baseline}; use --salvar-baseline.", file=sys.stderr)
+        return 2
+    if baseline.get('seed') != args.seed:
+        print("A semente difere da linha de base; setups não são comparáveis.", file=sys.stderr)
+        return 2
+    regressoes = compare(resultados, baseline['resultados'], args.tolerancia_tempo, args.tolerancia_memoria)
+    for regressao in regressoes:
+        print(f"REGRESSÃO: {regressao}", file=sys.stderr)
+    if not regressoes: print("Sem regressões em relação à linha de base.")
+    return 1 if regressoes else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# dashboard/modules/__init__.py
+"""
+Núcleo do planejador (carga de dados, preparação de tarefas e otimização), sem dependência
+do Streamlit: pode ser importado por scripts, pelo CLI em lote (`dashboard/batch.py`) e
+por benchmarks. Os submódulos são importados sob demanda, então `import modules` é barato
+e só o que for usado é carregado.
+"""
+
+import importlib
+
+# Nome público -> submódulo que o define
+_EXPORTS = {
+    'TaskTable': 'task_table',
+    'StructuresStore': 'data_handler',
+    'load_structures_store': 'data_handler',
+    'prepare_task_table_from_df': 'data_handler',
+    'prepare_task_list_from_df': 'data_handler',
+    'SetupTable': 'setup_matrix',
+    'load_setup_matrix': 'setup_matrix',
+    'run_full_optimization': 'optimizer',
+    'OptimizationCancelled': 'optimizer',
+    'OptimizationResult': 'optimizer',
+    'RunMetrics': 'diagnostics',
+    'build_timeline': 'timeline',
+    'run_full_optimization_cached': 'result_cache',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f'{__name__}.{_EXPORTS[name]}'), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -1,12 +1,30 @@
 # dashboard/modules/data_handler.py
 
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
 import pandas as pd
-import streamlit as st 
 import numpy as np
 
+from modules.task_table import TaskTable
+
+# Caminho padrão das estruturas de engenharia (relativo à raiz do projeto)
+ESTRUTURAS_PATH = 'data/processed/Planilha_Estruturas - Produto_Cor_Dim.csv'
+
 # Velocidade padrão da monovia (m/min), usada no cálculo de tempo de produção
 VELOCIDADE_MONOVIA = 2.0
 
+# Cache colunar do CSV de estruturas (gravado ao lado do arquivo de origem)
+STRUCTURES_CACHE_SUFFIX = '.cache.parquet'
+STRUCTURES_CACHE_META_SUFFIX = '.cache.json'
+
+# Memoização da tabela de tarefas (chave: hash dos pedidos + hash das estruturas)
+TASK_LIST_CACHE_SIZE = 8
+_TASK_LIST_CACHE = OrderedDict()
+_TASK_LIST_CACHE_LOCK = threading.Lock()
+
 
 def normalize_codigo(codigo):
     """
@@ -24,44 +42,206 @@ def normalize_codigo(codigo):
     return ''.join(filter(str.isdigit, codigo_str))
 
 
-@st.cache_data
+def normalize_codigo_series(serie):
+    """
+    Versão vetorizada de `normalize_codigo` para uma coluna inteira
+    (mesmas regras, aplicadas com operações de string do pandas).
+    """
+    codigos = (
+        serie.astype(str).astype(object)
+        .str.strip()
+        .str.replace(r'\.0$', '', regex=True)
+        .str.replace(r'\D', '', regex=True)
+    )
+    return codigos.where(serie.notna(), None)
+
+
+class StructuresStore:
+    """
+    Base de estruturas de engenharia normalizada uma única vez e tratada como somente leitura.
+    - `df`: DataFrame com 'CODIGO_PRODUTO' já normalizado.
+    - Índice hash código do produto -> posições das linhas, para buscas O(1).
+    A mesma instância é compartilhada por todas as sessões; nenhuma função deve alterá-la.
+    """
+
+    def __init__(self, df):
+        df = df.copy()
+        df['CODIGO_PRODUTO'] = normalize_codigo_series(df['CODIGO_PRODUTO'])
+        self.df = df
+        self.content_hash = dataframe_content_hash(df)
+        self._index = {
+            codigo: posicoes
+            for codigo, posicoes in df.groupby('CODIGO_PRODUTO', sort=False).indices.items()
+        }
+
+    def lookup(self, codigo):
+        """Retorna as linhas de estrutura do produto (DataFrame vazio se o código não existir)."""
+        posicoes = self._index.get(normalize_codigo(codigo), [])
+        return self.df.iloc[posicoes]
+
+
+def _file_sha256(path):
+    """Calcula o hash SHA-256 do conteúdo de um arquivo (leitura em blocos)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+def _tmp_path(path):
+    """Nome temporário exclusivo do processo/thread, para gravações concorrentes (ex.: workers do batch)."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _write_json_atomic(path, data):
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_structures_cache(path, stat):
+    """
+    Lê o cache colunar (Parquet) das estruturas, se ainda for válido para o CSV de origem.
+    O cache é válido quando mtime/tamanho do CSV não mudaram; se só o mtime mudou,
+    o hash do conteúdo decide (e os metadados são atualizados).
+    """
+    cache_path, meta_path = path + STRUCTURES_CACHE_SUFFIX, path + STRUCTURES_CACHE_META_SUFFIX
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta['mtime_ns'], meta['size']) != (stat.st_mtime_ns, stat.st_size):
+            if meta['size'] != stat.st_size or meta['sha256'] != _file_sha256(path):
+                return None
+            meta.update(mtime_ns=stat.st_mtime_ns)
+            _write_json_atomic(meta_path, meta)
+        return pd.read_parquet(cache_path)
+    except (OSError, ValueError, KeyError, ImportError):
+        return None
+
+
+def _write_structures_cache(path, stat, df):
+    """
+    Grava o cache colunar e seus metadados; falhas apenas desativam o cache.
+    Os dois arquivos são gravados em nomes temporários exclusivos e publicados com
+    `os.replace`, então processos que gravam ao mesmo tempo nunca expõem um arquivo parcial.
+    """
+    cache_path, meta_path = path + STRUCTURES_CACHE_SUFFIX, path + STRUCTURES_CACHE_META_SUFFIX
+    tmp_path = _tmp_path(cache_path)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        _write_json_atomic(meta_path, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': _file_sha256(path)})
+    except (OSError, ValueError, TypeError, ImportError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
 def load_structures_data(path):
     """
-    Carrega o arquivo de estruturas de engenharia (CSV) e mantém em cache.
+    Carrega o arquivo de estruturas de engenharia (CSV).
     - Usa encoding 'latin1' para compatibilidade com arquivos exportados.
     - Normaliza os códigos de produto já na leitura.
-    - Em caso de erro, exibe mensagem no Streamlit.
+    - Mantém um cache colunar tipado (Parquet) ao lado do CSV, reconstruído apenas
+      quando o mtime ou o conteúdo do arquivo de origem mudam.
+    - Retorna None se o arquivo não existir (a interface e o CLI exibem o erro).
     """
     try:
-        df = pd.read_csv(path, sep=';', encoding='latin1')
-        df['CODIGO_PRODUTO'] = df['CODIGO_PRODUTO'].apply(normalize_codigo)
-        return df
+        stat = os.stat(path)
     except FileNotFoundError:
-        st.error(f"Arquivo de estruturas não encontrado em: {path}. Verifique o caminho no servidor.")
         return None
 
+    df = _read_structures_cache(path, stat)
+    if df is None:
+        df = pd.read_csv(path, sep=';', encoding='latin1')
+        _write_structures_cache(path, stat, df)
+    df['CODIGO_PRODUTO'] = normalize_codigo_series(df['CODIGO_PRODUTO'])
+    return df
 
-def prepare_task_list(uploaded_file, df_estruturas):
-    """
-    Prepara a lista de tarefas de pintura a partir:
-    - Do arquivo de pedidos (upload do usuário).
-    - Dos dados de estrutura de engenharia (df_estruturas).
 
-    Principais etapas:
-    1. Leitura e limpeza dos pedidos.
-    2. Normalização de códigos de produto.
-    3. Junção com as estruturas de engenharia.
-    4. Cálculo da necessidade de produção.
-    5. Cálculo do tempo estimado por tarefa.
-    6. Retorno da lista de tarefas em formato de dicionários.
+def load_structures_store(path):
+    """
+    Carrega as estruturas e devolve um `StructuresStore` (ou None se o arquivo não existir).
+    A interface guarda o resultado com `st.cache_resource` (uma carga por processo,
+    compartilhada sem cópia entre sessões e reruns).
     """
+    df = load_structures_data(path)
+    if df is None:
+        return None
+    return StructuresStore(df)
+
 
+def prepare_task_list(uploaded_file, df_estruturas):
+    """
+    Prepara a lista de tarefas de pintura a partir de um arquivo de pedidos (CSV em bytes).
+    Lê o arquivo e delega para `prepare_task_list_from_df`.
+    """
     # Se não houver arquivo ou estrutura carregada, retorna lista vazia
     if uploaded_file is None or df_estruturas is None:
         return []
 
     # Lê o arquivo de pedidos enviado (CSV em bytes)
     df_pedidos = pd.read_csv(uploaded_file, sep=',', encoding='latin1')
+    return prepare_task_list_from_df(df_pedidos, df_estruturas)
+
+
+def dataframe_content_hash(df):
+    """Hash SHA-256 do conteúdo de um DataFrame (colunas, dtypes, índice e valores)."""
+    digest = hashlib.sha256()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def prepare_task_table_cached(df_pedidos, estruturas):
+    """
+    Versão memoizada de `prepare_task_table_from_df` para a interface.
+    A chave é o hash do conteúdo dos pedidos e das estruturas (`StructuresStore`), então
+    reruns do Streamlit com as mesmas entradas não refazem o processamento.
+    A `TaskTable` é imutável, então a mesma instância é compartilhada (sem cópias).
+    """
+    if df_pedidos is None or estruturas is None:
+        return TaskTable({}, 0)
+    chave = (dataframe_content_hash(df_pedidos), estruturas.content_hash)
+    with _TASK_LIST_CACHE_LOCK:
+        tarefas = _TASK_LIST_CACHE.get(chave)
+        if tarefas is not None:
+            _TASK_LIST_CACHE.move_to_end(chave)
+    if tarefas is None:
+        tarefas = prepare_task_table_from_df(df_pedidos, estruturas)
+        with _TASK_LIST_CACHE_LOCK:
+            _TASK_LIST_CACHE[chave] = tarefas
+            while len(_TASK_LIST_CACHE) > TASK_LIST_CACHE_SIZE:
+                _TASK_LIST_CACHE.popitem(last=False)
+    return tarefas
+
+
+def prepare_task_list_from_df(df_pedidos, df_estruturas):
+    """Lista de tarefas (um dicionário por lote) de `prepare_task_table_from_df`."""
+    return prepare_task_table_from_df(df_pedidos, df_estruturas).records()
+
+
+def prepare_task_table_from_df(df_pedidos, df_estruturas):
+    """
+    Prepara a tabela de tarefas de pintura (`TaskTable`) a partir:
+    - Do DataFrame de pedidos (em memória; não é alterado).
+    - Dos dados de estrutura de engenharia: um `StructuresStore` (já normalizado) ou o
+      DataFrame de estruturas, cujos códigos são normalizados aqui (sem alterar o original).
+
+    Principais etapas:
+    1. Limpeza dos pedidos.
+    2. Normalização de códigos de produto.
+    3. Junção com as estruturas de engenharia.
+    4. Cálculo da necessidade de produção.
+    5. Cálculo do tempo estimado por tarefa.
+    6. Retorno da tabela de tarefas (colunas NumPy, sem um dicionário por lote).
+    """
+    if df_pedidos is None or df_estruturas is None:
+        return TaskTable({}, 0)
+    df_pedidos = df_pedidos.copy()
 
     # Conversão e limpeza de colunas numéricas
     cols_numericas = ['Pedidos', 'Estoque']
@@ -77,8 +257,11 @@ def prepare_task_list(uploaded_file, df_estruturas):
     df_pedidos.dropna(subset=['Data_Entrega', 'CODIGO_PRODUTO'], inplace=True)
 
     # --- Normalização dos códigos ---
-    df_pedidos['CODIGO_PRODUTO'] = df_pedidos['CODIGO_PRODUTO'].apply(normalize_codigo)
-    df_estruturas['CODIGO_PRODUTO'] = df_estruturas['CODIGO_PRODUTO'].apply(normalize_codigo)
+    df_pedidos['CODIGO_PRODUTO'] = normalize_codigo_series(df_pedidos['CODIGO_PRODUTO'])
+    if isinstance(df_estruturas, StructuresStore):
+        df_estruturas = df_estruturas.df
+    else:
+        df_estruturas = df_estruturas.assign(CODIGO_PRODUTO=normalize_codigo_series(df_estruturas['CODIGO_PRODUTO']))
 
     # Merge entre pedidos e estruturas (traz descrição, componentes, etc.)
     df_merged = pd.merge(
@@ -87,65 +270,62 @@ def prepare_task_list(uploaded_file, df_estruturas):
         suffixes=('_pedido', '_estrutura')
     )
 
-    lista_tarefas_pintura = []
-
-    # Itera sobre cada pedido para montar as tarefas
-    for _, item in df_merged.iterrows():
-        necessidade = item['Pedidos'] - item['Estoque']  # cálculo da necessidade real
-
-        # Só gera tarefa se houver necessidade e componente válido
-        if necessidade > 0 and pd.notna(item.get('CODIGO_COMPONENTE')):
-
-            # --- Tratamento de valores individuais da estrutura ---
-            # Peças por gancheira
-            raw_pecas_g = item.get('Peças p/ gancheira')
-            numeric_pecas_g = pd.to_numeric(raw_pecas_g, errors='coerce')
-            pecas_g = 1 if pd.isna(numeric_pecas_g) or numeric_pecas_g == 0 else int(numeric_pecas_g)
-
-            # Estoque de gancheiras
-            raw_estoque_g = item.get('Estoque Gancheiras')
-            numeric_estoque_g = pd.to_numeric(raw_estoque_g, errors='coerce')
-            estoque_g = 0 if pd.isna(numeric_estoque_g) else int(numeric_estoque_g)
-
-            # Espaçamento (metros por peça)
-            raw_espac = item.get('Espaçamento')
-            numeric_espac = pd.to_numeric(raw_espac, errors='coerce')
-            espac = 0.5 if pd.isna(numeric_espac) else float(numeric_espac)
-
-            # Cálculo do tempo estimado de produção (em minutos)
-            t_calc_min = ((necessidade / pecas_g) * espac) / VELOCIDADE_MONOVIA
-
-            # Monta o dicionário representando a tarefa
-            tarefa = {
-                'DESCRICAO_PRODUTO': item.get('DESCRICAO_PRODUTO_pedido', 'N/A'),
-                'Componente': item.get('Componente', 'N/A'),
-                'CODIGO_PRODUTO_FINAL': item['CODIGO_PRODUTO'],  # produto final
-                'CODIGO_COMPONENTE': item['CODIGO_COMPONENTE'],
-                'CODIGO_PRODUTO': item['CODIGO_COMPONENTE'],  # redundância p/ otimização
-                'Tinta': item.get('DESC_COR', 'N/A'),
-                'Quantidade_Planejada': necessidade,
-                'Estoque': item['Estoque'],
-                'Pedidos': item['Pedidos'],
-                'Data_de_Entrega': item['Data_Entrega'],
-                'Tempo_Calculado_Minutos': t_calc_min,
-                'Pecas_por_Gancheira': pecas_g,
-                'ESTOQUE_GANCHEIRA': estoque_g,
-                'DISTANCIA_M': espac,
-                'PECAS_COM_PROCESSO_ADICIONAL': item.get('PECAS_COM_PROCESSO_ADICIONAL', 'Não'),
-                'FORNECIMENTO_METALURGIA': item.get('FORNECIMENTO_METALURGIA', float('inf')),
-                'CAPACIDADE_GAIOLAS': item.get('CAPACIDADE_GAIOLAS', float('inf'))
-            }
-
-            lista_tarefas_pintura.append(tarefa)
-
-    # --- Tratamento final ---
-    # Remove duplicatas que podem ser criadas pelo merge
-    if lista_tarefas_pintura:
-        df_final = pd.DataFrame(lista_tarefas_pintura).drop_duplicates(
-            subset=['CODIGO_PRODUTO_FINAL', 'CODIGO_COMPONENTE', 'Componente', 'Tinta']
-        )
-        # Retorna lista de dicionários (formato fácil de manipular em Streamlit)
-        return df_final.to_dict('records')
-
-    # Caso não haja tarefas válidas
-    return []
+    # --- Filtro de necessidade (operação sobre colunas inteiras) ---
+    necessidade = df_merged['Pedidos'] - df_merged['Estoque']  # cálculo da necessidade real
+    if 'CODIGO_COMPONENTE' not in df_merged.columns:
+        return TaskTable({}, 0)
+    # Só gera tarefa se houver necessidade e componente válido
+    df_validos = df_merged[(necessidade > 0) & df_merged['CODIGO_COMPONENTE'].notna()]
+
+    def coluna(df, nome, padrao):
+        """Retorna a coluna do merge, ou uma coluna constante quando ela não existe."""
+        if nome in df.columns:
+            return df[nome]
+        return pd.Series(padrao, index=df.index, dtype=object if isinstance(padrao, str) else None)
+
+    # Monta as chaves das tarefas e remove as duplicatas criadas pelo merge
+    # antes de qualquer cálculo por tarefa
+    df_final = pd.DataFrame({
+        'DESCRICAO_PRODUTO': coluna(df_validos, 'DESCRICAO_PRODUTO_pedido', 'N/A'),
+        'Componente': coluna(df_validos, 'Componente', 'N/A'),
+        'CODIGO_PRODUTO_FINAL': df_validos['CODIGO_PRODUTO'],  # produto final
+        'CODIGO_COMPONENTE': df_validos['CODIGO_COMPONENTE'],
+        'CODIGO_PRODUTO': df_validos['CODIGO_COMPONENTE'],  # redundância p/ otimização
+        'Tinta': coluna(df_validos, 'DESC_COR', 'N/A'),
+    }).drop_duplicates(subset=['CODIGO_PRODUTO_FINAL', 'CODIGO_COMPONENTE', 'Componente', 'Tinta'])
+
+    if df_final.empty:
+        # Caso não haja tarefas válidas
+        return TaskTable({}, 0)
+    df_validos = df_validos.loc[df_final.index]
+
+    # --- Tratamento vetorizado dos valores da estrutura ---
+    # Peças por gancheira (ausente ou zero -> 1)
+    numeric_pecas_g = pd.to_numeric(coluna(df_validos, 'Peças p/ gancheira', np.nan), errors='coerce')
+    pecas_g = numeric_pecas_g.where(numeric_pecas_g.notna() & (numeric_pecas_g != 0), 1).astype(int)
+
+    # Estoque de gancheiras (ausente -> 0)
+    numeric_estoque_g = pd.to_numeric(coluna(df_validos, 'Estoque Gancheiras', np.nan), errors='coerce')
+    estoque_g = numeric_estoque_g.fillna(0).astype(int)
+
+    # Espaçamento em metros por peça (ausente -> 0.5)
+    numeric_espac = pd.to_numeric(coluna(df_validos, 'Espaçamento', np.nan), errors='coerce')
+    espac = numeric_espac.fillna(0.5).astype(float)
+
+    necessidade = necessidade.loc[df_final.index]
+    # Cálculo do tempo estimado de produção (em minutos)
+    t_calc_min = ((necessidade / pecas_g) * espac) / VELOCIDADE_MONOVIA
+
+    df_final['Quantidade_Planejada'] = necessidade
+    df_final['Estoque'] = df_validos['Estoque']
+    df_final['Pedidos'] = df_validos['Pedidos']
+    df_final['Data_de_Entrega'] = df_validos['Data_Entrega']
+    df_final['Tempo_Calculado_Minutos'] = t_calc_min
+    df_final['Pecas_por_Gancheira'] = pecas_g
+    df_final['ESTOQUE_GANCHEIRA'] = estoque_g
+    df_final['DISTANCIA_M'] = espac
+    df_final['PECAS_COM_PROCESSO_ADICIONAL'] = coluna(df_validos, 'PECAS_COM_PROCESSO_ADICIONAL', 'Não')
+    df_final['FORNECIMENTO_METALURGIA'] = coluna(df_validos, 'FORNECIMENTO_METALURGIA', float('inf'))
+    df_final['CAPACIDADE_GAIOLAS'] = coluna(df_validos, 'CAPACIDADE_GAIOLAS', float('inf'))
+
+    return TaskTable.from_frame(df_final)
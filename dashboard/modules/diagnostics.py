@@ -0,0 +1,117 @@
+# dashboard/modules/diagnostics.py
+
+import cProfile
+import io
+import os
+import pstats
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Diretório dos perfis cProfile gerados sob demanda (`profiled`)
+PROFILE_DIR = 'data/profiles'
+
+# Contadores da busca tabu, acumulados em um dicionário por dia (`new_search_stats`)
+SEARCH_COUNTERS = ('iterations', 'neighbors_evaluated', 'tabu_rejections', 'improving_iterations')
+
+
+def new_search_stats():
+    """
+    Contadores da busca de um dia: iterações executadas, vizinhos avaliados, movimentos
+    barrados pela memória tabu e iterações que melhoraram a melhor solução.
+    """
+    return dict.fromkeys(SEARCH_COUNTERS, 0)
+
+
+def add_search_stats(stats, other):
+    for key in SEARCH_COUNTERS:
+        stats[key] += other[key]
+
+
+class DayMetrics:
+    """Métricas do sequenciamento (estágio 2) de um dia."""
+
+    def __init__(self, day, solver, n_items, seconds, setup_before, setup_after, stats=None):
+        self.day = day
+        self.solver = solver
+        self.n_items = n_items
+        self.seconds = seconds
+        self.setup_before = setup_before
+        self.setup_after = setup_after
+        stats = stats or new_search_stats()
+        self.iterations = stats['iterations']
+        self.neighbors_evaluated = stats['neighbors_evaluated']
+        self.tabu_rejections = stats['tabu_rejections']
+        self.improving_iterations = stats['improving_iterations']
+
+
+class RunMetrics:
+    """
+    Métricas de uma execução de `run_full_optimization`: tempo de parede de cada estágio
+    (pré-processamento, planejamento inicial ou reparo, sequenciamento) e as métricas de
+    cada dia. `cached` indica que o resultado veio do cache em disco (os números são os da
+    execução original), `profile_path` aponta o perfil cProfile, quando solicitado, e
+    `violations` traz as violações de restrição do cronograma final (`validation.validate_schedule`).
+    """
+
+    def __init__(self, n_tasks=0, warm_start=False):
+        self.n_tasks = n_tasks
+        self.warm_start = warm_start
+        self.preprocessing_seconds = 0.0
+        self.initial_schedule_seconds = 0.0
+        self.sequencing_seconds = 0.0
+        self.total_seconds = 0.0
+        self.days = []
+        self.profile_path = None
+        self.cached = False
+        self.violations = None
+
+    def total(self, attr):
+        """Soma de um atributo de `DayMetrics` em todos os dias."""
+        return sum(getattr(day, attr) for day in self.days)
+
+    @property
+    def setup_before(self):
+        return self.total('setup_before')
+
+    @property
+    def setup_after(self):
+        return self.total('setup_after')
+
+    def to_frame(self):
+        """Uma linha por dia, com os rótulos usados na interface e nas exportações."""
+        return pd.DataFrame([{
+            'Dia': day.day,
+            'Sequenciador': day.solver,
+            'Lotes': day.n_items,
+            'Tempo (s)': round(day.seconds, 3),
+            'Setup antes (min)': day.setup_before,
+            'Setup depois (min)': day.setup_after,
+            'Iterações': day.iterations,
+            'Vizinhos avaliados': day.neighbors_evaluated,
+            'Rejeições tabu': day.tabu_rejections,
+            'Iterações com melhora': day.improving_iterations,
+        } for day in self.days])
+
+
+@contextmanager
+def profiled(path=None):
+    """Executa o bloco sob cProfile e grava o perfil em `path` (sem `path`, não faz nada)."""
+    if not path:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def profile_summary(path, limit=25):
+    """Texto com as `limit` funções de maior tempo acumulado de um perfil gravado."""
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,155 @@
+# dashboard/modules/jobs.py
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import diagnostics, optimizer, result_cache, sweep
+
+# Máximo de otimizações executando ao mesmo tempo no servidor; as demais aguardam na fila
+MAX_CONCURRENT_JOBS = 2
+# Jobs finalizados e nunca lidos (sessão fechada) são descartados após este tempo, em segundos
+FINISHED_JOB_TTL_SECONDS = 3600
+
+STATUS_QUEUED = 'na fila'
+STATUS_RUNNING = 'executando'
+STATUS_DONE = 'concluído'
+STATUS_CANCELLED = 'cancelado'
+STATUS_FAILED = 'erro'
+
+KIND_OPTIMIZATION = 'otimizacao'
+KIND_SWEEP = 'varredura'
+
+
+class OptimizationJob:
+    """
+    Estado de uma otimização (ou varredura de cenários) em segundo plano, lido pela página a
+    cada atualização do progresso. Na varredura, `days_planned`/`total_days` contam os
+    cenários concluídos/totais.
+    """
+
+    def __init__(self, owner, n_tasks, config=None, kind=KIND_OPTIMIZATION):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.kind = kind
+        self.n_tasks = n_tasks
+        self.config = config
+        self.status = STATUS_QUEUED
+        self.days_planned = 0
+        self.total_days = 0
+        self.setup_cost = 0
+        self.result = None
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (STATUS_DONE, STATUS_CANCELLED, STATUS_FAILED)
+
+    @property
+    def fraction(self):
+        """Fração dos dias já sequenciados (0 enquanto o planejamento inicial roda)."""
+        return self.days_planned / self.total_days if self.total_days else 0.0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class JobRunner:
+    """
+    Executa `run_full_optimization` (e as varreduras de `sweep.run_sweep`) em um pool de
+    threads com limite de concorrência. Cada job pertence a uma sessão (`owner`): uma sessão
+    só enxerga e cancela os próprios jobs, e enviar um novo job cancela o anterior do mesmo
+    tipo na mesma sessão. Jobs finalizados saem do registro em `release` ou, se a sessão não
+    voltar para lê-los, após `FINISHED_JOB_TTL_SECONDS`.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='otimizador')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, task_list, config, previous_result=None, profile=False):
+        """Enfileira a otimização; com `profile`, grava um perfil cProfile em PROFILE_DIR/<id do job>.prof."""
+        job = OptimizationJob(owner, len(task_list), config)
+        profile_path = os.path.join(diagnostics.PROFILE_DIR, f'{job.id}.prof') if profile else None
+        self._register(job)
+        self._executor.submit(self._run, job, task_list, config, previous_result, profile_path)
+        return job.id
+
+    def submit_sweep(self, owner, task_list, config, grids):
+        """Enfileira uma varredura de cenários; ocupa uma vaga do pool como uma otimização."""
+        job = OptimizationJob(owner, len(task_list), config, kind=KIND_SWEEP)
+        self._register(job)
+        self._executor.submit(self._run_sweep, job, task_list, config, grids)
+        return job.id
+
+    def _register(self, job):
+        with self._lock:
+            self._expire_finished(time.time())
+            for other in self._jobs.values():
+                if other.owner == job.owner and other.kind == job.kind and not other.finished:
+                    other.cancel()
+            self._jobs[job.id] = job
+
+    def get(self, owner, job_id):
+        """Retorna o job se ele pertencer à sessão informada."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    def cancel(self, owner, job_id):
+        job = self.get(owner, job_id)
+        if job is not None: job.cancel()
+
+    def release(self, owner, job_id):
+        """Descarta um job finalizado depois que a sessão leu o resultado."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.owner == owner and job.finished:
+                del self._jobs[job_id]
+
+    def _expire_finished(self, now):
+        """Descarta os jobs finalizados há mais de `FINISHED_JOB_TTL_SECONDS` (chamado com o lock)."""
+        expirados = [job_id for job_id, job in self._jobs.items()
+                     if job.finished and job.finished_at is not None and now - job.finished_at > FINISHED_JOB_TTL_SECONDS]
+        for job_id in expirados:
+            del self._jobs[job_id]
+
+    def _run(self, job, task_list, config, previous_result, profile_path=None):
+        def progress(dias_planejados, total_dias, setup_acumulado):
+            job.days_planned, job.total_days, job.setup_cost = dias_planejados, total_dias, setup_acumulado
+
+        self._execute(job, lambda: result_cache.run_full_optimization_cached(
+            task_list, config, previous_result=previous_result,
+            progress_callback=progress, cancel_event=job.cancel_event, profile_path=profile_path
+        ))
+
+    def _run_sweep(self, job, task_list, config, grids):
+        def progress(concluidos, total):
+            job.days_planned, job.total_days = concluidos, total
+
+        self._execute(job, lambda: sweep.run_sweep(
+            task_list, config, grids, progress_callback=progress, cancel_event=job.cancel_event
+        ))
+
+    def _execute(self, job, target):
+        if job.cancel_event.is_set():
+            job.status = STATUS_CANCELLED
+            return
+        job.status, job.started_at = STATUS_RUNNING, time.time()
+        try:
+            job.result = target()
+            job.status = STATUS_DONE
+        except optimizer.OptimizationCancelled:
+            job.status = STATUS_CANCELLED
+        except Exception:
+            job.error = traceback.format_exc()
+            job.status = STATUS_FAILED
+        finally:
+            job.finished_at = time.time()
@@ -1,36 +1,78 @@
 # app/modules/optimizer.py
 
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-import copy
-import math
+import heapq
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import diagnostics, setup_matrix, validation
+from modules.setup_matrix import change_cost, pair_cost
+from modules.task_table import MISSING, TaskTable
 
 # --- PARÂMETROS GLOBAIS (APENAS CONSTANTES TÉCNICAS) ---
-MONOVIA_LENGHT_METERS = 168
+MONOVIA_LENGHT_METERS = validation.MONOVIA_LENGHT_METERS
+
+
+class OptimizationCancelled(Exception):
+    """Levantada quando a otimização é cancelada pelo usuário (via `cancel_event`)."""
+
+
+class OptimizationResult(tuple):
+    """
+    Resultado de `run_full_optimization`: desempacota como (cronograma, rejeitados) e traz
+    as métricas da execução em `.metrics` (`diagnostics.RunMetrics`).
+    """
+
+    def __new__(cls, schedule, rejected, metrics=None):
+        result = super().__new__(cls, (schedule, rejected))
+        result.metrics = metrics
+        return result
+
+    def __getnewargs__(self):
+        return self[0], self[1], self.metrics
 
 # --- FUNÇÕES DE LÓGICA E OTIMIZAÇÃO (VERSÃO FINAL COM HORIZONTE DE PLANEJAMENTO) ---
 
 def preprocessar_pedidos(lista_de_pedidos):
-    """Aplica regras de negócio (antecipação) lidas dos próprios dados."""
-    pedidos_ajustados = copy.deepcopy(lista_de_pedidos)
+    """
+    Aplica regras de negócio (antecipação) lidas dos próprios dados.
+    Recebe uma `TaskTable` (ou lista de dicionários) e devolve uma nova tabela: só as colunas
+    alteradas são novas, o restante é compartilhado com a entrada (nada é copiado lote a lote).
+    """
+    tabela = as_task_table(lista_de_pedidos)
     DIAS_ANTECIPACAO = 2
-    for item in pedidos_ajustados:
-        if item.get('PECAS_COM_PROCESSO_ADICIONAL') == 'Sim':
-            item['Data_de_Entrega'] -= timedelta(days=DIAS_ANTECIPACAO)
-            item['Observacao'] = f'Entrega antecipada em {DIAS_ANTECIPACAO} dias'
-    return pedidos_ajustados
+    if 'PECAS_COM_PROCESSO_ADICIONAL' not in tabela: return tabela
+    antecipar = tabela.column('PECAS_COM_PROCESSO_ADICIONAL') == 'Sim'
+    if not antecipar.any(): return tabela
+    entrega = tabela.column('Data_de_Entrega').copy()
+    antecipacao = np.timedelta64(DIAS_ANTECIPACAO, 'D') if entrega.dtype.kind == 'M' else timedelta(days=DIAS_ANTECIPACAO)
+    entrega[antecipar] = entrega[antecipar] - antecipacao
+    if 'Observacao' in tabela:
+        observacao = tabela.column('Observacao').astype(object)
+    else:
+        observacao = np.full(len(tabela), MISSING, dtype=object)
+    observacao[antecipar] = f'Entrega antecipada em {DIAS_ANTECIPACAO} dias'
+    return tabela.replace(Data_de_Entrega=entrega, Observacao=observacao)
+
+def as_task_table(tasks):
+    """Aceita uma `TaskTable` ou uma lista de dicionários de lotes."""
+    return tasks if isinstance(tasks, TaskTable) else TaskTable.from_records(tasks)
 
 def calculate_cost(sequence, setup_cor, setup_peca, initial_item=None):
-    """Calcula o custo total de setup de uma sequência."""
-    total_setup_cost = 0
+    """
+    Calcula o custo total de setup de uma sequência.
+    `setup_cor`/`setup_peca` são custos fixos por troca ou `SetupTable` (setup dependente da sequência).
+    """
     if not sequence: return 0
-    if initial_item:
-        if initial_item['Tinta'] != sequence[0]['Tinta']: total_setup_cost += setup_cor
-        if initial_item['CODIGO_PRODUTO'] != sequence[0]['CODIGO_PRODUTO']: total_setup_cost += setup_peca
-    for i in range(len(sequence) - 1):
-        if sequence[i]['Tinta'] != sequence[i+1]['Tinta']: total_setup_cost += setup_cor
-        if sequence[i]['CODIGO_PRODUTO'] != sequence[i+1]['CODIGO_PRODUTO']: total_setup_cost += setup_peca
-    return total_setup_cost
+    colors, pieces = encode_sequence(sequence, initial_item, setup_cor, setup_peca)
+    total = pair_cost(setup_cor, colors[:-1], colors[1:]).sum() + pair_cost(setup_peca, pieces[:-1], pieces[1:]).sum()
+    return total.item()
 
 def calculate_prioritization_score(item):
     """Calcula a pontuação de prioridade para um item."""
@@ -38,149 +80,896 @@ def calculate_prioritization_score(item):
     due_date = item['Data_de_Entrega']
     return (1 if saldo >= 0 else 0, due_date.timestamp(), -abs(saldo) if saldo < 0 else 0)
 
-def create_initial_schedule(unscheduled_items, config):
+def task_id(item):
+    """Identificador de um lote: produto final + componente + tinta."""
+    return f"{item['CODIGO_PRODUTO_FINAL']}_{item['CODIGO_COMPONENTE']}_{item['Tinta']}"
+
+def gancheira_rejection(item):
+    """Retorna o motivo de rejeição permanente por falta de gancheiras, ou None se o lote é planejável."""
+    gancheiras, falta = validation.hanger_shortage(item['Quantidade_Planejada'], item['Pecas_por_Gancheira'], item['ESTOQUE_GANCHEIRA'], item['DISTANCIA_M'])
+    return validation.MSG_GANCHEIRAS.format(int(gancheiras), item['ESTOQUE_GANCHEIRA']) if falta else None
+
+def create_initial_schedule(unscheduled_items, config, start_date=None):
     """
     ESTÁGIO 1: Planeja a produção diária com um 'Horizonte de Planejamento'.
+    Trabalha sobre os índices de linha da `TaskTable` (ou da lista de lotes recebida);
+    os lotes só viram dicionários no retorno.
+    `start_date` é a data do primeiro dia planejado (padrão: agora).
     """
-    schedule, permanently_rejected = [], []
-    plannable_items = []
+    tabela = as_task_table(unscheduled_items)
+    n = len(tabela)
+    if not n: return [], []
+    ids = np.empty(n, dtype=object)
+    ids[:] = [f"{a}_{b}_{c}" for a, b, c in zip(tabela.values('CODIGO_PRODUTO_FINAL'), tabela.values('CODIGO_COMPONENTE'), tabela.values('Tinta'))]
+    tabela = tabela.replace(id_tarefa=ids)
+    motivos, motivos_temporarios = {}, {}  # linha -> motivo (rejeição definitiva / do último dia em que falhou)
+    rejeitados = []
 
     # FILTRO 1 (PERMANENTE): Restrição de Gancheiras
-    for item in unscheduled_items:
-        item['id_tarefa'] = f"{item['CODIGO_PRODUTO_FINAL']}_{item['CODIGO_COMPONENTE']}_{item['Tinta']}"
-        gancheiras_necessarias = math.ceil(item['Quantidade_Planejada'] / item['Pecas_por_Gancheira'])
-        comprimento_na_monovia = gancheiras_necessarias * item['DISTANCIA_M']
-        falta_gancheiras = gancheiras_necessarias > item['ESTOQUE_GANCHEIRA']
-        reutilizacao_nao_ocorre = comprimento_na_monovia <= MONOVIA_LENGHT_METERS
-        if falta_gancheiras and reutilizacao_nao_ocorre:
-            item['Motivo_Rejeicao'] = f"Gancheiras Insuficientes ({gancheiras_necessarias} > {item['ESTOQUE_GANCHEIRA']}) e Monovia Curta"
-            permanently_rejected.append(item)
-        else:
-            plannable_items.append(item)
+    quantidade = tabela.numeric('Quantidade_Planejada')
+    gancheiras, falta_gancheiras = validation.hanger_shortage(
+        quantidade, tabela.numeric('Pecas_por_Gancheira'), tabela.numeric('ESTOQUE_GANCHEIRA'), tabela.numeric('DISTANCIA_M')
+    )
+    for r in np.flatnonzero(falta_gancheiras).tolist():
+        motivos[r] = validation.MSG_GANCHEIRAS.format(int(gancheiras[r]), tabela.value('ESTOQUE_GANCHEIRA', r))
+        rejeitados.append(r)
+    plannable = np.flatnonzero(~falta_gancheiras)
+
+    # --- ÍNDICES DO POOL DE LINHAS PLANEJÁVEIS ---
+    # A ordem de prioridade é (pontuação, linha), equivalente ao sort estável de
+    # `calculate_prioritization_score`; 'rank' é a posição de cada linha nessa ordem.
+    # Remoções são marcadas em 'removed' e descartadas de forma preguiçosa pelos índices.
+    saldo = tabela.numeric('Estoque') - tabela.numeric('Pedidos')
+    entrega = tabela.datetimes('Data_de_Entrega').view(np.int64)
+    falta = np.where(saldo < 0, -np.abs(saldo), 0)
+    order = plannable[np.lexsort((plannable, falta[plannable], entrega[plannable], saldo[plannable] >= 0))]
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    order, rank = order.tolist(), rank.tolist()
+    removed = [False] * n
+    n_remaining = len(plannable)
+    idx_por_tarefa = {}
+    for r in plannable.tolist():
+        idx_por_tarefa.setdefault(ids[r], []).append(r)
+    # Índice por data de entrega: a janela do horizonte avança com searchsorted
+    due_order = plannable[np.argsort(entrega[plannable], kind='stable')]
+    due_dates = entrega[due_order]
+    due_order = due_order.tolist()
+    due_ptr = 0
+    window = []  # heap de ranks das linhas dentro do horizonte
+    rank_ptr, first_ptr = 0, 0
+    plannable = plannable.tolist()
+    pool_sorted = False
+
+    # Colunas usadas nos filtros diários, como listas Python (acesso rápido no laço)
+    setup_cor, setup_peca = config['setup_cor'], config['setup_peca']
+    codigos_cor, cores = tabela.codes('Tinta')
+    codigos_peca, pecas = tabela.codes('CODIGO_PRODUTO')
+    cor = setup_matrix.encode(setup_cor, cores)[codigos_cor].tolist()
+    peca = setup_matrix.encode(setup_peca, pecas)[codigos_peca].tolist()
+    produto = codigos_peca.tolist()
+    qtd = quantidade.tolist()
+    tempo = tabela.numeric('Tempo_Calculado_Minutos').tolist()
+    fornecimento = tabela.numeric('FORNECIMENTO_METALURGIA', float('inf')).tolist()
+    gaiolas = tabela.numeric('CAPACIDADE_GAIOLAS', float('inf')).tolist()
+
+    def remove(r):
+        nonlocal n_remaining
+        removed[r] = True
+        n_remaining -= 1
 
+    schedule = []
     day_number = 1
     # Simula a data de início do planejamento como sendo a data atual
-    current_planning_date = datetime.now()
+    current_planning_date = start_date or datetime.now()
     
-    while plannable_items:
+    while n_remaining:
         # --- LÓGICA DO HORIZONTE DE PLANEJAMENTO ---
         horizonte_dias = config.get('horizonte_dias', 7) # Pega o valor do config, com 7 como padrão
         data_limite = current_planning_date + timedelta(days=horizonte_dias)
 
-        # Filtra apenas os itens dentro do horizonte de planejamento
-        itens_no_horizonte = [item for item in plannable_items if item['Data_de_Entrega'] <= data_limite]
+        # Avança a janela: entram apenas as linhas com entrega até a data limite
+        limite = np.datetime64(data_limite, 'ns').astype(np.int64)
+        new_ptr = max(due_ptr, int(np.searchsorted(due_dates, limite, side='right')))
+        for r in due_order[due_ptr:new_ptr]:
+            if not removed[r]: heapq.heappush(window, rank[r])
+        due_ptr = new_ptr
+
+        # A priorização acontece apenas nas linhas dentro do horizonte
+        horizonte = []
+        while window:
+            k = heapq.heappop(window)
+            if not removed[order[k]]: horizonte.append(k)
         
         # Fallback: Se não houver itens no horizonte, pega o mais urgente de todos para não parar a produção.
-        if not itens_no_horizonte and plannable_items:
-            plannable_items.sort(key=calculate_prioritization_score)
-            itens_no_horizonte = plannable_items
-        
-        # A priorização agora acontece apenas nos itens dentro do horizonte
-        itens_no_horizonte.sort(key=calculate_prioritization_score)
+        fallback = not horizonte
+        if fallback:
+            horizonte = sorted(rank[r] for r in due_order[due_ptr:] if not removed[r])
+            pool_sorted = True
         
         # --- FIM DA LÓGICA DO HORIZONTE ---
 
         consumo_metalurgia_diario, consumo_gaiolas_diario = {}, {}
-        items_for_today, items_not_today = [], []
-        time_used_today, last_color, last_piece_code = 0, None, None
+        items_for_today = []
+        time_used_today, last = 0, None
 
-        for item in itens_no_horizonte:
-            cod_produto, qtd_planejada = item['CODIGO_PRODUTO'], item['Quantidade_Planejada']
+        for k in horizonte:
+            r = order[k]
+            cod_produto, qtd_planejada = produto[r], qtd[r]
             motivo_falha_diaria = None
 
             # FILTROS DIÁRIOS (Metalurgia, Gaiolas, Tempo)
-            fornecimento_max = item.get('FORNECIMENTO_METALURGIA', float('inf'))
-            consumo_metalurgia_diario.setdefault(cod_produto, 0)
-            if consumo_metalurgia_diario[cod_produto] + qtd_planejada > fornecimento_max:
-                motivo_falha_diaria = f"Excede Fornecimento Metalurgia (Max: {fornecimento_max})"
+            consumo = consumo_metalurgia_diario.get(cod_produto, 0)
+            if consumo + qtd_planejada > fornecimento[r]:
+                motivo_falha_diaria = validation.MSG_METALURGIA.format(tabela.value('FORNECIMENTO_METALURGIA', r, float('inf')))
             
             if not motivo_falha_diaria:
-                capacidade_max = item.get('CAPACIDADE_GAIOLAS', float('inf'))
-                consumo_gaiolas_diario.setdefault(cod_produto, 0)
-                if consumo_gaiolas_diario[cod_produto] + qtd_planejada > capacidade_max:
-                    motivo_falha_diaria = f"Excede Capacidade Gaiolas (Max: {capacidade_max})"
+                if consumo_gaiolas_diario.get(cod_produto, 0) + qtd_planejada > gaiolas[r]:
+                    motivo_falha_diaria = validation.MSG_GAIOLAS.format(tabela.value('CAPACIDADE_GAIOLAS', r, float('inf')))
 
             if not motivo_falha_diaria:
-                item_time = item['Tempo_Calculado_Minutos']
+                item_time = tempo[r]
                 setup_cost = 0
-                if items_for_today:
-                    if last_color != item['Tinta']: setup_cost += config['setup_cor']
-                    if last_piece_code != cod_produto: setup_cost += config['setup_peca']
+                if last is not None:
+                    setup_cost = setup_matrix.code_cost(setup_cor, cor[last], cor[r]) + setup_matrix.code_cost(setup_peca, peca[last], peca[r])
                 if time_used_today + item_time + setup_cost > config['daily_capacity']:
-                    motivo_falha_diaria = "Excede Tempo de Produção do Dia"
+                    motivo_falha_diaria = validation.MSG_TEMPO
 
             if motivo_falha_diaria is None:
-                items_for_today.append(item)
+                items_for_today.append(r)
                 time_used_today += item_time + setup_cost
-                if cod_produto in consumo_metalurgia_diario: consumo_metalurgia_diario[cod_produto] += qtd_planejada
-                if cod_produto in consumo_gaiolas_diario: consumo_gaiolas_diario[cod_produto] += qtd_planejada
-                last_color, last_piece_code = item['Tinta'], cod_produto
+                consumo_metalurgia_diario[cod_produto] = consumo + qtd_planejada
+                consumo_gaiolas_diario[cod_produto] = consumo_gaiolas_diario.get(cod_produto, 0) + qtd_planejada
+                last = r
             else:
-                item['Motivo_Rejeicao_Temporario'] = motivo_falha_diaria
-                items_not_today.append(item)
+                motivos_temporarios[r] = motivo_falha_diaria
         
-        # Itens que sobraram para os próximos dias
-        ids_agendados = {item['id_tarefa'] for item in items_for_today}
-        plannable_items = [item for item in plannable_items if item['id_tarefa'] not in ids_agendados]
-
-        if not items_for_today and plannable_items:
-            item_rejeitado = plannable_items[0]
-            item_rejeitado['Motivo_Rejeicao'] = item_rejeitado.get('Motivo_Rejeicao_Temporario', "Não coube no cronograma (gargalo de capacidade)")
-            permanently_rejected.append(item_rejeitado)
-            plannable_items.pop(0)
+        # Linhas que sobraram para os próximos dias (remoção incremental por id_tarefa)
+        for id_tarefa in {ids[r] for r in items_for_today}:
+            for r in idx_por_tarefa.pop(id_tarefa):
+                if not removed[r]: remove(r)
+        # O que sobrou do horizonte continua ordenado, logo já é um heap válido
+        if not fallback:
+            window = [k for k in horizonte if not removed[order[k]]]
+
+        if not items_for_today and n_remaining:
+            # Rejeita a primeira linha do pool (ordem original, ou de prioridade após um fallback)
+            if pool_sorted:
+                while removed[order[rank_ptr]]: rank_ptr += 1
+                r = order[rank_ptr]
+            else:
+                while removed[plannable[first_ptr]]: first_ptr += 1
+                r = plannable[first_ptr]
+            motivos[r] = motivos_temporarios.get(r, "Não coube no cronograma (gargalo de capacidade)")
+            rejeitados.append(r)
+            remove(r)
             continue
 
-        if not items_for_today and not plannable_items:
+        if not items_for_today and not n_remaining:
             break
 
         schedule.append({'day': day_number, 'items': items_for_today})
         day_number += 1
         current_planning_date += timedelta(days=1)
         
-    for item in plannable_items:
-        item['Motivo_Rejeicao'] = "Não coube no cronograma (sem capacidade futura)"
-        permanently_rejected.append(item)
-        
-    return schedule, permanently_rejected
+    for r in (order if pool_sorted else plannable):
+        if removed[r]: continue
+        motivos[r] = "Não coube no cronograma (sem capacidade futura)"
+        rejeitados.append(r)
+
+    # Materializa cada lote uma única vez, com as marcas do planejamento
+    lotes = tabela.records()
+    for r, motivo in motivos_temporarios.items():
+        lotes[r]['Motivo_Rejeicao_Temporario'] = motivo
+    for r, motivo in motivos.items():
+        lotes[r]['Motivo_Rejeicao'] = motivo
+    for day in schedule:
+        day['items'] = [lotes[r] for r in day['items']]
+    return schedule, [lotes[r] for r in rejeitados]
+
+def transition_cost(prev_item, next_item, setup_cor, setup_peca):
+    """Calcula o custo de setup de uma única transição (prev -> next) entre dois itens."""
+    if not prev_item: return 0
+    return (change_cost(setup_cor, prev_item['Tinta'], next_item['Tinta'])
+            + change_cost(setup_peca, prev_item['CODIGO_PRODUTO'], next_item['CODIGO_PRODUTO']))
+
+def swap_delta(sequence, i, j, setup_cor, setup_peca, initial_item=None):
+    """
+    Calcula a variação de custo da troca das posições i e j (i < j) sem copiar a sequência.
+    Apenas as (até quatro) transições que tocam i e j são reavaliadas; a transição 0
+    corresponde à fronteira com o `initial_item` (último item do dia anterior).
+    """
+    def item_at(k, swapped):
+        if k < 0: return initial_item
+        if swapped:
+            if k == i: return sequence[j]
+            if k == j: return sequence[i]
+        return sequence[k]
+
+    # A transição k liga a posição k-1 à posição k
+    edges = {k for k in (i, i + 1, j, j + 1) if k < len(sequence)}
+    delta = 0
+    for k in edges:
+        delta -= transition_cost(item_at(k - 1, False), item_at(k, False), setup_cor, setup_peca)
+        delta += transition_cost(item_at(k - 1, True), item_at(k, True), setup_cor, setup_peca)
+    return delta
+
+def best_swap(sequence, setup_cor, setup_peca, initial_item=None, tabu_list=()):
+    """Percorre a vizinhança de trocas em Python e retorna o melhor movimento não-tabu e sua variação de custo."""
+    best_delta, best_move = float('inf'), None
+    for i in range(len(sequence)):
+        for j in range(i + 1, len(sequence)):
+            move = (i, j)
+            if move in tabu_list: continue
+            delta = swap_delta(sequence, i, j, setup_cor, setup_peca, initial_item)
+            if delta < best_delta:
+                best_delta, best_move = delta, move
+    return best_move, best_delta
+
+def encode_sequence(sequence, initial_item=None, setup_cor=None, setup_peca=None):
+    """
+    Codifica 'Tinta' e 'CODIGO_PRODUTO' da sequência como vetores de inteiros.
+    Quando há `initial_item`, ele ocupa a posição 0 dos vetores. Com `SetupTable`, os
+    códigos são os índices da tabela compilada (para consulta direta com `pair_cost`).
+    """
+    items = ([initial_item] if initial_item else []) + list(sequence)
+    colors = setup_matrix.encode(setup_cor, [item['Tinta'] for item in items])
+    pieces = setup_matrix.encode(setup_peca, [item['CODIGO_PRODUTO'] for item in items])
+    return colors, pieces
+
+def transition_matrix(colors, pieces, setup_cor, setup_peca):
+    """
+    Matriz de custo de transição entre as posições dos vetores codificados, com uma
+    sentinela de custo zero em cada ponta (a posição x dos vetores fica no índice x + 1).
+    """
+    m = len(colors)
+    D = np.zeros((m + 2, m + 2))
+    D[1:-1, 1:-1] = pair_cost(setup_cor, colors[:, None], colors[None, :]) + pair_cost(setup_peca, pieces[:, None], pieces[None, :])
+    return D
+
+def swap_delta_matrix(colors, pieces, setup_cor, setup_peca, offset=0):
+    """
+    Calcula, em um único passo NumPy, a variação de custo de todas as trocas (i, j) da sequência.
+    `offset` indica quantas posições iniciais dos vetores são fixas (1 quando há `initial_item`).
+    Retorna uma matriz n x n indexada pelas posições da sequência, com +inf onde j <= i.
+    """
+    m = len(colors)
+    n = m - offset
+    D = transition_matrix(colors, pieces, setup_cor, setup_peca)
+    positions = np.arange(offset, m) + 1
+    I, J = positions[:, None], positions[None, :]
+    old = D[I - 1, I] + D[I, I + 1] + D[J - 1, J] + D[J, J + 1]
+    new = D[I - 1, J] + D[J, I + 1] + D[J - 1, I] + D[I, J + 1]
+    # Em trocas adjacentes a transição (i, j) é contada duas vezes em 'old' e vira (j, i)
+    delta = new - old + np.where(J == I + 1, D[I, J] + D[J, I], 0)
+    delta[np.tril_indices(n)] = np.inf
+    return delta
+
+def best_relocation(D, n, base, max_segment=3, tabu_list=()):
+    """
+    Melhor movimento de realocação de segmento (Or-opt; com segmento de tamanho 1 é a inserção).
+    O segmento [a, a+L-1] sai da sequência e é inserido antes da posição p (p == n: no fim).
+    `D` vem de `transition_matrix` e `base` é o índice de D da posição 0 da sequência.
+    Retorna ((a, L, p), variação de custo) ou (None, inf).
+    """
+    best_move, best_delta = None, float('inf')
+    P = np.arange(n + 1)
+    U, V = P + base - 1, P + base  # vizinhos entre os quais o segmento entra
+    for L in range(1, min(max_segment, n - 1) + 1):
+        a = np.arange(n - L + 1)
+        A, B = a + base, a + base + L - 1
+        removal = -D[A - 1, A] - D[B, B + 1] + D[A - 1, B + 1]
+        insertion = -D[U, V][None, :] + D[U[None, :], A[:, None]] + D[B[:, None], V[None, :]]
+        delta = removal[:, None] + insertion
+        # Inserir dentro do próprio segmento ou logo após ele não muda a sequência
+        delta[(P[None, :] >= a[:, None]) & (P[None, :] <= a[:, None] + L)] = np.inf
+        for start, length in tabu_list:
+            if length == L and start < len(a): delta[start, :] = np.inf
+        k = int(np.argmin(delta))
+        if delta.flat[k] < best_delta:
+            best_delta = delta.flat[k].item()
+            best_move = (k // (n + 1), L, k % (n + 1))
+    return best_move, best_delta
+
+def best_reversal(D, n, base, tabu_list=()):
+    """
+    Melhor movimento 2-opt: inverte o segmento [a, b]. As duas transições das pontas mudam e,
+    com setup assimétrico, as internas passam a ser percorridas no sentido contrário
+    (diferença obtida em O(1) por movimento com somas acumuladas).
+    Retorna ((a, b), variação de custo) ou (None, inf).
+    """
+    if n < 2: return None, float('inf')
+    A = np.arange(n) + base
+    delta = (-D[A - 1, A])[:, None] - D[A, A + 1][None, :] + D[(A - 1)[:, None], A[None, :]] + D[A[:, None], (A + 1)[None, :]]
+    reverso = np.concatenate(([0.0], np.cumsum(D[A[1:], A[:-1]] - D[A[:-1], A[1:]])))
+    delta += reverso[None, :] - reverso[:, None]
+    delta[np.tril_indices(n)] = np.inf
+    for a, b in tabu_list: delta[a, b] = np.inf
+    k = int(np.argmin(delta))
+    if not np.isfinite(delta.flat[k]): return None, float('inf')
+    return divmod(k, n), delta.flat[k].item()
+
+def apply_relocation(sequence, a, L, p):
+    """Aplica a realocação do segmento [a, a+L-1] para antes da posição p; retorna (nova sequência, nova posição do segmento)."""
+    segment = sequence[a:a + L]
+    rest = sequence[:a] + sequence[a + L:]
+    q = p if p < a else p - L
+    return rest[:q] + segment + rest[q:], q
+
+def best_swap_vectorized(colors, pieces, setup_cor, setup_peca, offset=0, tabu_list=()):
+    """Equivalente vetorizado de `best_swap`: mesmo movimento escolhido (primeiro mínimo em ordem (i, j))."""
+    n = len(colors) - offset
+    if n < 2: return None, float('inf')
+    delta = swap_delta_matrix(colors, pieces, setup_cor, setup_peca, offset)
+    for i, j in tabu_list: delta[i, j] = np.inf
+    i, j = divmod(int(np.argmin(delta)), n)
+    if not np.isfinite(delta[i, j]): return None, float('inf')
+    return (i, j), delta[i, j].item()
+
+def swap_deltas(colors, pieces, valid, I, J, setup_cor, setup_peca):
+    """
+    Variação de custo de um lote de trocas (I[k], J[k]), com I < J, avaliada de uma vez com NumPy.
+    `colors`/`pieces`/`valid` são vetores com uma posição extra em cada ponta: a posição 0 é o
+    `initial_item` (ou uma sentinela inválida) e a última é uma sentinela; transições que
+    envolvem sentinelas custam zero. I e J já estão nesse índice deslocado (posição + 1).
+    """
+    def T(x, y):
+        return (valid[x] & valid[y]) * (pair_cost(setup_cor, colors[x], colors[y]) + pair_cost(setup_peca, pieces[x], pieces[y]))
+    old = T(I - 1, I) + T(I, I + 1) + T(J - 1, J) + T(J, J + 1)
+    new = T(I - 1, J) + T(J, I + 1) + T(J - 1, I) + T(I, J + 1)
+    # Em trocas adjacentes a transição (i, j) é contada duas vezes em 'old' e vira (j, i)
+    return new - old + (T(I, J) + T(J, I)) * (J == I + 1)
+
+def candidate_moves(colors, pieces, valid, color_pos, piece_pos, setup_cor, setup_peca, list_size=3):
+    """
+    Lista de candidatos: apenas trocas capazes de eliminar uma transição com setup.
+    Para cada quebra entre as posições k-1 e k, propõe trazer para k um lote com a mesma
+    cor/peça de k-1, ou para k-1 um lote com a mesma cor/peça de k (até `list_size` por atributo).
+    Trabalha nos vetores deslocados de `swap_deltas`; retorna os pares (I, J) nesse índice.
+    """
+    n = len(colors) - 2
+    k = np.arange(1, n + 1)
+    custo = (valid[k - 1] & valid[k]) * (pair_cost(setup_cor, colors[k - 1], colors[k]) + pair_cost(setup_peca, pieces[k - 1], pieces[k]))
+    moves = set()
+    for k in k[custo > 0].tolist():
+        for target, ref in ((k, k - 1), (k - 1, k)):
+            if not 1 <= target <= n: continue
+            for positions in (color_pos.get(colors[ref], ()), piece_pos.get(pieces[ref], ())):
+                for j in itertools.islice(positions, list_size):
+                    if j != target: moves.add((min(target, j), max(target, j)))
+    if not moves:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    I, J = np.array(sorted(moves), dtype=np.int64).T
+    return I, J
+
+def candidate_tabu_search(daily_sequence, config, initial_item=None, deadline=None, cancel_event=None, stats=None):
+    """
+    Busca tabu para dias grandes, com custo por iteração próximo de linear:
+    - vizinhança restrita à lista de candidatos (`candidate_moves`), pontuada com `swap_deltas`;
+    - memória tabu por atributo (lote, posição) em dicionário, com consulta O(1): após a troca,
+      cada lote fica proibido de voltar à posição de onde saiu por 'tabu_tenure' iterações;
+    - critério de aspiração: um movimento tabu é aceito se gerar a melhor solução já vista.
+    Mesmos critérios de parada e contadores (`stats`) de `tabu_search_optimizer`.
+    """
+    if stats is None: stats = diagnostics.new_search_stats()
+    setup_cor, setup_peca = config['setup_cor'], config['setup_peca']
+    tenure, list_size = config.get('tabu_tenure', 7), config.get('candidate_list_size', 3)
+    max_stall = config.get('max_stall_iterations')
+    current_solution = list(daily_sequence)
+    best_solution = list(current_solution)
+    current_cost = best_cost = calculate_cost(current_solution, setup_cor, setup_peca, initial_item)
+    lower_bound = setup_lower_bound(current_solution, setup_cor, setup_peca, initial_item)
+
+    # Vetores deslocados: posição 0 = initial_item (ou sentinela), última posição = sentinela
+    colors, pieces = encode_sequence(current_solution, initial_item, setup_cor, setup_peca)
+    if not initial_item:
+        colors, pieces = np.concatenate(([0], colors)), np.concatenate(([0], pieces))
+    colors, pieces = np.append(colors, 0), np.append(pieces, 0)
+    valid = np.ones(len(colors), dtype=bool)
+    valid[[0, -1]] = bool(initial_item), False
+    ids = np.arange(len(colors))  # identidade estável de cada lote
+    color_pos, piece_pos = {}, {}
+    for pos in range(1, len(colors) - 1):
+        color_pos.setdefault(colors[pos], set()).add(pos)
+        piece_pos.setdefault(pieces[pos], set()).add(pos)
+
+    tabu = {}  # (id do lote, posição) -> última iteração em que o atributo é tabu
+    stall = 0
+    for iteration in range(config.get('max_iterations', 100)):
+        if best_cost <= lower_bound: break
+        if max_stall is not None and stall >= max_stall: break
+        if deadline is not None and time.monotonic() >= deadline: break
+        if cancel_event is not None and cancel_event.is_set(): break
+        I, J = candidate_moves(colors, pieces, valid, color_pos, piece_pos, setup_cor, setup_peca, list_size)
+        if not len(I): break
+        deltas = swap_deltas(colors, pieces, valid, I, J, setup_cor, setup_peca)
+        stats['neighbors_evaluated'] += len(I)
+        aspiracao = current_cost + deltas < best_cost
+        # Os candidatos já vêm em ordem (I, J): o primeiro mínimo é o desempate determinístico
+        for m in np.argsort(deltas, kind='stable').tolist():
+            i, j = int(I[m]), int(J[m])
+            is_tabu = tabu.get((ids[j], i), -1) >= iteration or tabu.get((ids[i], j), -1) >= iteration
+            if not is_tabu or aspiracao[m]: break
+            stats['tabu_rejections'] += 1
+        else:
+            break
+        stats['iterations'] += 1
+        for codes, index in ((colors, color_pos), (pieces, piece_pos)):
+            if codes[i] != codes[j]:
+                index[codes[i]].discard(i); index[codes[i]].add(j)
+                index[codes[j]].discard(j); index[codes[j]].add(i)
+        tabu[(ids[i], i)] = tabu[(ids[j], j)] = iteration + tenure
+        for arr in (colors, pieces, ids):
+            arr[[i, j]] = arr[[j, i]]
+        current_solution[i - 1], current_solution[j - 1] = current_solution[j - 1], current_solution[i - 1]
+        current_cost += deltas[m].item()
+        if current_cost < best_cost:
+            best_solution, best_cost = list(current_solution), current_cost
+            stats['improving_iterations'] += 1
+            stall = 0
+        else:
+            stall += 1
+    return best_solution
 
-def tabu_search_optimizer(daily_sequence, config, initial_item=None):
-    """ESTÁGIO 2: Otimiza a sequência de um único dia."""
+def tabu_search_optimizer(daily_sequence, config, initial_item=None, deadline=None, cancel_event=None, stats=None):
+    """
+    ESTÁGIO 2: Otimiza a sequência de um único dia (avaliação incremental das trocas).
+    Com config['vectorized_search'], a vizinhança inteira é pontuada de uma vez com NumPy.
+    config['neighborhoods'] escolhe os movimentos: 'swap' (padrão), 'insertion', 'or_opt'
+    (segmentos de até config['or_opt_max_segment'] lotes) e 'two_opt' (inversão de segmento).
+    Dias com config['candidate_list_threshold'] itens ou mais usam `candidate_tabu_search`.
+    A busca para antes de config['max_iterations'] ao atingir o limite inferior do dia,
+    após config['max_stall_iterations'] iterações sem melhora ou ao passar do `deadline`
+    (time.monotonic()) ou quando `cancel_event` é sinalizado; em todos os casos retorna
+    a melhor solução encontrada até ali.
+    `stats` (de `diagnostics.new_search_stats`) acumula iterações, vizinhos avaliados,
+    movimentos barrados pela memória tabu e iterações com melhora.
+    """
+    if len(daily_sequence) >= config.get('candidate_list_threshold', 200):
+        return candidate_tabu_search(daily_sequence, config, initial_item, deadline, cancel_event, stats)
+    if stats is None: stats = diagnostics.new_search_stats()
+    setup_cor, setup_peca = config['setup_cor'], config['setup_peca']
+    vectorized = config.get('vectorized_search', False)
+    neighborhoods = config.get('neighborhoods', ('swap',))
+    extra_moves = 'insertion' in neighborhoods or 'or_opt' in neighborhoods or 'two_opt' in neighborhoods
+    max_segment = config.get('or_opt_max_segment', 3) if 'or_opt' in neighborhoods else 1
+    tenure = config.get('tabu_tenure', 7)
+    max_stall = config.get('max_stall_iterations')
     current_solution, best_solution = list(daily_sequence), list(daily_sequence)
-    best_cost = calculate_cost(best_solution, config['setup_cor'], config['setup_peca'], initial_item)
-    tabu_list = []
+    current_cost = best_cost = calculate_cost(best_solution, setup_cor, setup_peca, initial_item)
+    lower_bound = setup_lower_bound(best_solution, setup_cor, setup_peca, initial_item)
+    offset = 1 if initial_item else 0
+    if vectorized or extra_moves:
+        colors, pieces = encode_sequence(current_solution, initial_item, setup_cor, setup_peca)
+    # Memórias tabu por tipo de movimento: pares trocados, segmentos realocados e invertidos
+    tabu_list, relocation_tabu, reversal_tabu = [], [], []
+    stall = 0
     for _ in range(config.get('max_iterations', 100)):
-        best_neighbor, best_neighbor_cost, best_move = None, float('inf'), None
-        for i in range(len(current_solution)):
-            for j in range(i + 1, len(current_solution)):
-                neighbor = list(current_solution)
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                move = tuple(sorted((i, j)))
-                if move in tabu_list: continue
-                neighbor_cost = calculate_cost(neighbor, config['setup_cor'], config['setup_peca'], initial_item)
-                if neighbor_cost < best_neighbor_cost:
-                    best_neighbor, best_neighbor_cost, best_move = neighbor, neighbor_cost, move
-        if best_neighbor:
-            current_solution = best_neighbor
+        if best_cost <= lower_bound: break
+        if max_stall is not None and stall >= max_stall: break
+        if deadline is not None and time.monotonic() >= deadline: break
+        if cancel_event is not None and cancel_event.is_set(): break
+        # Avalia cada vizinhança habilitada; em empate vale a ordem troca, realocação, inversão
+        candidates = []
+        n = len(current_solution)
+        if 'swap' in neighborhoods:
+            stats['neighbors_evaluated'] += n * (n - 1) // 2
+            stats['tabu_rejections'] += len(set(tabu_list))
+            if vectorized:
+                candidates.append(('swap',) + best_swap_vectorized(colors, pieces, setup_cor, setup_peca, offset, tabu_list))
+            else:
+                candidates.append(('swap',) + best_swap(current_solution, setup_cor, setup_peca, initial_item, tabu_list))
+        if extra_moves:
+            D = transition_matrix(colors, pieces, setup_cor, setup_peca)
+            base = offset + 1
+            if 'insertion' in neighborhoods or 'or_opt' in neighborhoods:
+                candidates.append(('relocation',) + best_relocation(D, n, base, max_segment, relocation_tabu))
+                # Na realocação, a rejeição tabu vale para o segmento (todas as posições de destino)
+                stats['neighbors_evaluated'] += sum((n - L + 1) * (n - L) for L in range(1, min(max_segment, n - 1) + 1))
+                stats['tabu_rejections'] += len(set(relocation_tabu))
+            if 'two_opt' in neighborhoods:
+                candidates.append(('reversal',) + best_reversal(D, n, base, reversal_tabu))
+                stats['neighbors_evaluated'] += n * (n - 1) // 2
+                stats['tabu_rejections'] += len(set(reversal_tabu))
+        candidates = [c for c in candidates if c[1] is not None]
+        if not candidates: break
+        stats['iterations'] += 1
+        kind, best_move, best_delta = min(candidates, key=lambda c: c[2])
+        # A vizinha só é materializada quando o movimento é aceito
+        if kind == 'swap':
+            i, j = best_move
+            current_solution = list(current_solution)
+            current_solution[i], current_solution[j] = current_solution[j], current_solution[i]
+            if vectorized or extra_moves:
+                colors[[i + offset, j + offset]] = colors[[j + offset, i + offset]]
+                pieces[[i + offset, j + offset]] = pieces[[j + offset, i + offset]]
             tabu_list.append(best_move)
-            if len(tabu_list) > config.get('tabu_tenure', 7): tabu_list.pop(0)
-            if best_neighbor_cost < best_cost: best_solution, best_cost = best_neighbor, neighbor_cost
+        else:
+            if kind == 'relocation':
+                a, L, p = best_move
+                current_solution, q = apply_relocation(current_solution, a, L, p)
+                relocation_tabu.append((q, L))
+            else:
+                a, b = best_move
+                current_solution = current_solution[:a] + current_solution[a:b + 1][::-1] + current_solution[b + 1:]
+                reversal_tabu.append(best_move)
+            colors, pieces = encode_sequence(current_solution, initial_item, setup_cor, setup_peca)
+        for memory in (tabu_list, relocation_tabu, reversal_tabu):
+            if len(memory) > tenure: memory.pop(0)
+        current_cost += best_delta
+        if current_cost < best_cost:
+            best_solution, best_cost = current_solution, current_cost
+            stats['improving_iterations'] += 1
+            stall = 0
+        else:
+            stall += 1
     return best_solution
 
-def run_full_optimization(task_list, config):
-    """Orquestra o processo completo de otimização."""
-    pedidos_prontos = preprocessar_pedidos(task_list)
-    initial_schedule, rejected_tasks = create_initial_schedule(pedidos_prontos, config)
-    
+def _portfolio_start(args):
+    """Uma partida do portfólio (executada em processo separado): retorna (custo, partida, ordem, contadores)."""
+    sequence, config, initial_item, start, deadline = args
+    order = list(range(len(sequence)))
+    config = dict(config)
+    if start > 0:
+        # Partidas adicionais: ordem inicial embaralhada e duração tabu perturbada
+        rng = random.Random(config.get('portfolio_seed', 0) * 1000003 + start)
+        rng.shuffle(order)
+        config['tabu_tenure'] = max(1, config.get('tabu_tenure', 7) + rng.randint(-3, 3))
+    tagged = [dict(sequence[k], _pos=k) for k in order]
+    stats = diagnostics.new_search_stats()
+    best = tabu_search_optimizer(tagged, config, initial_item, deadline, stats=stats)
+    return calculate_cost(best, config['setup_cor'], config['setup_peca'], initial_item), start, [item['_pos'] for item in best], stats
+
+def portfolio_tabu_search(daily_sequence, config, initial_item=None, deadline=None, executor=None, stats=None):
+    """
+    Portfólio multi-partida: roda config['portfolio_starts'] buscas tabu do mesmo dia
+    (a partida 0 é a busca determinística padrão; as demais usam semente e duração tabu
+    diferentes) e fica com a de menor custo. Com `executor` (ProcessPoolExecutor) as
+    partidas rodam em paralelo; apenas 'Tinta'/'CODIGO_PRODUTO' são enviados aos processos.
+    Os contadores de todas as partidas são somados em `stats`.
+    """
+    def slim(item):
+        return {'Tinta': item['Tinta'], 'CODIGO_PRODUTO': item['CODIGO_PRODUTO']}
+    sequence = [slim(item) for item in daily_sequence]
+    initial = slim(initial_item) if initial_item else None
+    args = [(sequence, config, initial, start, deadline) for start in range(config.get('portfolio_starts', 1))]
+    results = list(executor.map(_portfolio_start, args) if executor else map(_portfolio_start, args))
+    if stats is not None:
+        for result in results: diagnostics.add_search_stats(stats, result[3])
+    _, _, order, _ = min(results, key=lambda result: (result[0], result[1]))
+    return [daily_sequence[k] for k in order]
+
+def portfolio_executor(config):
+    """Cria o pool de processos do portfólio (ou None quando há uma única partida)."""
+    if config.get('portfolio_starts', 1) <= 1: return None
+    workers = min(config.get('portfolio_workers') or os.cpu_count() or 1, config['portfolio_starts'])
+    # 'spawn' evita herdar o estado das threads do servidor Streamlit via fork
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def compress_into_blocks(items):
+    """
+    Agrupa os lotes de um dia com a mesma ('Tinta', 'CODIGO_PRODUTO') em blocos.
+    Lotes idênticos nessas chaves não geram setup entre si, então o sequenciamento
+    pode operar sobre os blocos sem alterar o custo. A ordem original dos lotes é
+    preservada dentro de cada bloco e os blocos seguem a ordem da primeira aparição.
+    """
+    blocks = {}
+    for item in items:
+        key = (item['Tinta'], item['CODIGO_PRODUTO'])
+        if key not in blocks:
+            blocks[key] = {'Tinta': item['Tinta'], 'CODIGO_PRODUTO': item['CODIGO_PRODUTO'], 'lotes': []}
+        blocks[key]['lotes'].append(item)
+    return list(blocks.values())
+
+def expand_blocks(blocks):
+    """Desfaz `compress_into_blocks`, devolvendo a sequência de lotes na ordem dos blocos."""
+    return [item for block in blocks for item in block['lotes']]
+
+def setup_lower_bound(sequence, setup_cor, setup_peca, initial_item=None):
+    """
+    Limite inferior do custo de setup de um dia: toda cor (e peça) distinta que não seja
+    a de partida exige ao menos uma troca para entrar na sequência.
+    Com `SetupTable`, cada entrada custa no mínimo a troca mais barata vinda de outro valor
+    do dia (ou do de partida); sem item inicial, a entrada mais cara é a que fica de fora.
+    """
+    if not sequence: return 0
+    total = 0
+    for setup, column in ((setup_cor, 'Tinta'), (setup_peca, 'CODIGO_PRODUTO')):
+        valores = list(dict.fromkeys(item[column] for item in sequence))
+        partida = initial_item[column] if initial_item else None
+        if not isinstance(setup, setup_matrix.SetupTable):
+            trocas = len(set(valores) - {partida}) if initial_item else len(valores) - 1
+            total += setup * trocas
+            continue
+        codes = setup.codes(valores)
+        origens = setup.codes(valores + ([partida] if initial_item else []))
+        entrada = setup.table[origens[:, None], codes[None, :]]
+        entrada[origens[:, None] == codes[None, :]] = np.inf
+        minima = entrada.min(axis=0) if len(origens) > 1 else np.zeros(len(codes))
+        minima[~np.isfinite(minima)] = 0
+        if initial_item:
+            total += minima[codes != setup.code(partida)].sum().item()
+        else:
+            total += minima.sum().item() - minima.max().item()
+    return total
+
+def exact_sequence_optimizer(daily_sequence, config, initial_item=None, deadline=None, cancel_event=None):
+    """
+    ESTÁGIO 2 (exato): Programação dinâmica (Held-Karp) sobre os grupos (Tinta, CODIGO_PRODUTO) do dia.
+    Agrupar lotes idênticos nunca aumenta o setup, então o ótimo sobre os grupos é o ótimo do dia.
+    Viável apenas para poucos grupos (custo O(2^k * k^2)).
+    Retorna None se o `deadline` (time.monotonic()) passar durante a programação dinâmica;
+    `cancel_event` sinalizado levanta `OptimizationCancelled`.
+    """
+    blocks = compress_into_blocks(daily_sequence)
+    k = len(blocks)
+    if k <= 1: return list(daily_sequence)
+    setup_cor, setup_peca = config['setup_cor'], config['setup_peca']
+    C = np.array([[transition_cost(a, b, setup_cor, setup_peca) for b in blocks] for a in blocks], dtype=float)
+    start = np.array([transition_cost(initial_item, b, setup_cor, setup_peca) for b in blocks], dtype=float)
+
+    full = (1 << k) - 1
+    dp = np.full((1 << k, k), np.inf)
+    parent = np.full((1 << k, k), -1, dtype=np.int64)
+    nodes = np.arange(k)
+    dp[1 << nodes, nodes] = start
+    for mask in range(1, full):
+        if not mask & 0xFF:
+            if cancel_event is not None and cancel_event.is_set(): raise OptimizationCancelled()
+            if deadline is not None and time.monotonic() >= deadline: return None
+        row = dp[mask]
+        if not np.isfinite(row).any(): continue
+        free = nodes[(mask >> nodes) & 1 == 0]
+        cand = row[:, None] + C[:, free]
+        best_prev = cand.argmin(axis=0)
+        best_cost = cand[best_prev, np.arange(len(free))]
+        new_masks = mask | (1 << free)
+        improved = best_cost < dp[new_masks, free]
+        dp[new_masks[improved], free[improved]] = best_cost[improved]
+        parent[new_masks[improved], free[improved]] = best_prev[improved]
+
+    # Reconstrói a ordem ótima a partir do último grupo
+    order, mask, last = [], full, int(dp[full].argmin())
+    while last != -1:
+        order.append(last)
+        prev = int(parent[mask, last])
+        mask &= ~(1 << last)
+        last = prev
+    return expand_blocks([blocks[g] for g in reversed(order)])
+
+def sequence_day(items, config, last_item=None, deadline=None, cancel_event=None, executor=None, stats=None):
+    """
+    Escolhe o sequenciador do dia (exato, portfólio tabu ou tabu) e retorna (sequência, nome do sequenciador).
+    Com o orçamento de tempo esgotado, o dia que iria para o exato mantém a ordem recebida ('sem_tempo').
+    """
+    n_grupos = len(compress_into_blocks(items))
+    if n_grupos <= config.get('exact_max_groups', 12):
+        if deadline is None or time.monotonic() < deadline:
+            refined = exact_sequence_optimizer(items, config, last_item, deadline, cancel_event)
+            if refined is not None: return refined, 'exato'
+        return list(items), 'sem_tempo'
+    block_compression = config.get('block_compression', True)
+    sequence = compress_into_blocks(items) if block_compression else items
+    if config.get('portfolio_starts', 1) > 1:
+        refined, solver = portfolio_tabu_search(sequence, config, last_item, deadline, executor, stats), 'portfolio'
+    else:
+        refined, solver = tabu_search_optimizer(sequence, config, initial_item=last_item, deadline=deadline, cancel_event=cancel_event, stats=stats), 'tabu'
+    return (expand_blocks(refined) if block_compression else refined), solver
+
+def sequence_schedule(days, config, deadline=None, progress_callback=None, cancel_event=None, executor=None, metrics=None):
+    """
+    ESTÁGIO 2 para o cronograma inteiro: sequencia cada dia a partir do último item do dia anterior.
+    Dias marcados com 'touched': False mantêm a sequência recebida (apenas os custos são recalculados).
+    `progress_callback(dias_planejados, total_dias, setup_acumulado)` é chamado ao fim de cada dia.
+    Com `metrics` (`diagnostics.RunMetrics`), registra o tempo, os contadores da busca e o
+    setup antes/depois de cada dia.
+    """
     optimized_schedule = []
     last_item = None
-    for day_data in initial_schedule:
-        refined_seq = tabu_search_optimizer(day_data['items'], config, initial_item=last_item)
+    setup_acumulado = 0
+    for day_data in days:
+        if cancel_event is not None and cancel_event.is_set():
+            raise OptimizationCancelled()
+        inicio, stats = time.perf_counter(), diagnostics.new_search_stats()
+        if day_data.get('touched', True):
+            refined_seq, solver = sequence_day(day_data['items'], config, last_item, deadline, cancel_event, executor, stats)
+            exact = solver == 'exato'
+        else:
+            refined_seq, solver, exact = day_data['items'], day_data.get('solver'), False
+        segundos = time.perf_counter() - inicio
         setup_cost = calculate_cost(refined_seq, config['setup_cor'], config['setup_peca'], last_item)
+        if metrics is not None:
+            setup_antes = calculate_cost(day_data['items'], config['setup_cor'], config['setup_peca'], last_item)
+            metrics.days.append(diagnostics.DayMetrics(day_data['day'], solver, len(refined_seq), segundos, setup_antes, setup_cost, stats))
+        lower_bound = setup_cost if exact else setup_lower_bound(refined_seq, config['setup_cor'], config['setup_peca'], last_item)
         prod_time = sum(item['Tempo_Calculado_Minutos'] for item in refined_seq)
         optimized_schedule.append({
             'day': day_data['day'], 'items': refined_seq,
-            'time_used_minutes': prod_time + setup_cost, 'setup_cost': setup_cost
+            'time_used_minutes': prod_time + setup_cost, 'setup_cost': setup_cost,
+            'solver': solver, 'lower_bound': lower_bound,
+            'optimality_gap': (setup_cost - lower_bound) / setup_cost if setup_cost else 0.0
         })
         if refined_seq: last_item = refined_seq[-1]
-            
-    return optimized_schedule, rejected_tasks
\ No newline at end of file
+        setup_acumulado += setup_cost
+        if progress_callback: progress_callback(len(optimized_schedule), len(days), setup_acumulado)
+    return optimized_schedule
+
+# Chaves do config que mudam a viabilidade ou o custo de um cronograma: com qualquer uma
+# diferente, o cronograma anterior não serve de partida a quente
+WARM_START_KEYS = ('horizonte_dias', 'daily_capacity', 'setup_cor', 'setup_peca', 'setup_cor_matrix', 'setup_peca_matrix')
+
+def warm_start_compatible(previous_config, config):
+    """True se o cronograma gerado com `previous_config` pode ser reparado sob `config`."""
+    return previous_config is not None and all(previous_config.get(key) == config.get(key) for key in WARM_START_KEYS)
+
+# Chaves adicionadas pelo próprio planejamento, ignoradas ao comparar versões de um lote
+_SCHEDULER_KEYS = {'id_tarefa', 'Motivo_Rejeicao', 'Motivo_Rejeicao_Temporario'}
+
+def _same_task(a, b):
+    """Compara duas versões de um lote ignorando as chaves do planejamento (NaN == NaN)."""
+    keys_a, keys_b = set(a) - _SCHEDULER_KEYS, set(b) - _SCHEDULER_KEYS
+    if keys_a != keys_b: return False
+    for key in keys_a:
+        va, vb = a[key], b[key]
+        if va is vb: continue
+        if pd.api.types.is_scalar(va) and pd.api.types.is_scalar(vb) and pd.isna(va) and pd.isna(vb): continue
+        if va != vb: return False
+    return True
+
+def within_horizon(item, day_date, config):
+    """True se o lote entra no horizonte de planejamento do dia `day_date` (mesma regra do estágio 1)."""
+    entrega = item.get('Data_de_Entrega')
+    if pd.isna(entrega): return True
+    return pd.Timestamp(entrega) <= pd.Timestamp(day_date + timedelta(days=config.get('horizonte_dias', 7)))
+
+def try_insert(day_items, item, config, last_item=None):
+    """
+    Tenta inserir um lote em um dia já planejado, na posição de menor acréscimo de setup.
+    Respeita os mesmos filtros diários de `create_initial_schedule` (metalurgia, gaiolas, tempo).
+    Retorna a nova lista de itens do dia, ou None se o lote não couber.
+    """
+    setup_cor, setup_peca = config['setup_cor'], config['setup_peca']
+    mesma_peca = [other for other in day_items if other['CODIGO_PRODUTO'] == item['CODIGO_PRODUTO']] + [item]
+    if not validation.supply_feasible(mesma_peca): return None
+
+    best_pos, best_delta = 0, float('inf')
+    for pos in range(len(day_items) + 1):
+        prev_item = day_items[pos - 1] if pos > 0 else last_item
+        next_item = day_items[pos] if pos < len(day_items) else None
+        delta = transition_cost(prev_item, item, setup_cor, setup_peca)
+        if next_item is not None:
+            delta += transition_cost(item, next_item, setup_cor, setup_peca) - transition_cost(prev_item, next_item, setup_cor, setup_peca)
+        if delta < best_delta: best_pos, best_delta = pos, delta
+
+    new_items = day_items[:best_pos] + [item] + day_items[best_pos:]
+    prod_time = sum(other['Tempo_Calculado_Minutos'] for other in new_items)
+    if prod_time + calculate_cost(new_items, setup_cor, setup_peca) > config['daily_capacity']: return None
+    return new_items
+
+def fit_day(day_items, config):
+    """
+    Reconfere um dia mantido pela partida a quente contra o config atual, na ordem recebida:
+    metalurgia e gaiolas por `validation.supply_feasible` e tempo com o setup dentro do dia.
+    Retorna (lotes que cabem, lotes removidos).
+    """
+    setup_cor, setup_peca = config['setup_cor'], config['setup_peca']
+    por_peca = {}
+    kept, evicted = [], []
+    time_used, last = 0, None
+    for item in day_items:
+        mesma_peca = por_peca.get(item['CODIGO_PRODUTO'], []) + [item]
+        item_time = item['Tempo_Calculado_Minutos'] + (transition_cost(last, item, setup_cor, setup_peca) if last is not None else 0)
+        if time_used + item_time > config['daily_capacity'] or not validation.supply_feasible(mesma_peca):
+            evicted.append(item)
+            continue
+        kept.append(item)
+        por_peca[item['CODIGO_PRODUTO']] = mesma_peca
+        time_used += item_time
+        last = item
+    return kept, evicted
+
+def repair_schedule(pedidos_prontos, config, previous_result):
+    """
+    Partida a quente: reaproveita um cronograma anterior e repara apenas o que mudou.
+    - Lotes inalterados permanecem no mesmo dia (e rejeitados inalterados seguem rejeitados).
+    - Lotes removidos ou alterados saem do seu dia, assim como os que deixaram de caber no
+      dia com o config atual (`fit_day`: capacidade, setups, limites de metalurgia e gaiolas).
+    - Lotes novos ou alterados são inseridos no primeiro dia em que couberem e cujo horizonte
+      (data do dia + horizonte_dias) alcance a sua entrega; o que não couber é planejado em
+      dias adicionais por `create_initial_schedule`, a partir da data seguinte ao último dia.
+    Retorna (dias com a marca 'touched', rejeitados) para o `sequence_schedule`.
+    """
+    previous_schedule, previous_rejected = previous_result
+    pendentes = {}
+    for item in pedidos_prontos:
+        pendentes.setdefault(task_id(item), []).append(item)
+
+    def reaproveitar(old_item):
+        candidatos = pendentes.get(old_item.get('id_tarefa', task_id(old_item)), [])
+        for k, new_item in enumerate(candidatos):
+            if _same_task(old_item, new_item):
+                return candidatos.pop(k)
+        return None
+
+    days = []
+    for day_data in previous_schedule:
+        kept, evicted = fit_day([old for old in day_data['items'] if reaproveitar(old) is not None], config)
+        # Os que não cabem mais voltam para a fila de inserção
+        for item in evicted:
+            pendentes.setdefault(task_id(item), []).append(item)
+        if kept:
+            days.append({'items': kept, 'solver': day_data.get('solver'), 'touched': len(kept) != len(day_data['items'])})
+    rejected = [old for old in previous_rejected if reaproveitar(old) is not None]
+
+    # Lotes novos ou alterados, em ordem de prioridade; o dia de posição k é datado em hoje + k
+    start_date = datetime.now()
+    candidatos = sorted((item for lista in pendentes.values() for item in lista), key=calculate_prioritization_score)
+    sobras = []
+    for item in candidatos:
+        item['id_tarefa'] = task_id(item)
+        motivo = gancheira_rejection(item)
+        if motivo:
+            item['Motivo_Rejeicao'] = motivo
+            rejected.append(item)
+            continue
+        last_item = None
+        for offset, day in enumerate(days):
+            # Dias cedo demais para a entrega do lote ficam de fora, como no estágio 1
+            new_items = try_insert(day['items'], item, config, last_item) if within_horizon(item, start_date + timedelta(days=offset), config) else None
+            if new_items is not None:
+                day['items'], day['touched'] = new_items, True
+                break
+            if day['items']: last_item = day['items'][-1]
+        else:
+            sobras.append(item)
+
+    extra_days, extra_rejected = create_initial_schedule(sobras, config, start_date + timedelta(days=len(days)))
+    days = days + extra_days
+    for number, day in enumerate(days, start=1):
+        day['day'] = number
+    return days, rejected + extra_rejected
+
+def run_full_optimization(task_list, config, previous_result=None, progress_callback=None, cancel_event=None, profile_path=None):
+    """
+    Orquestra o processo completo de otimização.
+    `task_list` é uma `TaskTable` (ou lista de dicionários de lotes); o cronograma e os
+    rejeitados são devolvidos como dicionários, um por lote.
+    Com `previous_result` = (cronograma, rejeitados) de uma execução anterior, faz uma
+    reotimização incremental: só os dias afetados pela mudança são reparados e resequenciados.
+    `progress_callback` e `cancel_event` (threading.Event) permitem acompanhar e cancelar a
+    execução; o cancelamento levanta `OptimizationCancelled`.
+    config['setup_cor_matrix'] / config['setup_peca_matrix'] (linhas [origem, destino, minutos])
+    ativam o setup dependente da sequência; os custos fixos valem para os pares fora da matriz.
+    Retorna um `OptimizationResult` (cronograma, rejeitados) com as métricas da execução em
+    `.metrics` (inclusive as violações de `validation.validate_schedule` no cronograma final);
+    com `profile_path`, a execução roda sob cProfile e o perfil é gravado nesse arquivo.
+    """
+    metrics = diagnostics.RunMetrics(len(task_list), warm_start=previous_result is not None)
+    inicio = time.perf_counter()
+    # Orçamento de tempo para toda a execução (config['max_seconds']), contado desde já:
+    # pré-processamento e estágio 1 consomem o mesmo orçamento; sem limite quando ausente
+    max_seconds = config.get('max_seconds')
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    with diagnostics.profiled(profile_path):
+        pedidos_prontos = preprocessar_pedidos(task_list)
+        config = setup_matrix.compile_setup_config(config, pedidos_prontos)
+        marca = time.perf_counter()
+        metrics.preprocessing_seconds = marca - inicio
+        if previous_result is not None:
+            initial_schedule, rejected_tasks = repair_schedule(pedidos_prontos.records(), config, previous_result)
+        else:
+            initial_schedule, rejected_tasks = create_initial_schedule(pedidos_prontos, config)
+        metrics.initial_schedule_seconds = time.perf_counter() - marca
+
+        marca = time.perf_counter()
+        executor = portfolio_executor(config)
+        try:
+            optimized_schedule = sequence_schedule(initial_schedule, config, deadline, progress_callback, cancel_event, executor, metrics)
+        finally:
+            if executor: executor.shutdown(cancel_futures=True)
+        metrics.sequencing_seconds = time.perf_counter() - marca
+        # Reconfere o cronograma final (ordem da busca tabu, lotes inseridos na partida a quente)
+        metrics.violations = validation.validate_schedule(optimized_schedule, config)
+    metrics.total_seconds = time.perf_counter() - inicio
+    metrics.profile_path = profile_path
+    return OptimizationResult(optimized_schedule, rejected_tasks, metrics)
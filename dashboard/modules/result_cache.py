@@ -0,0 +1,120 @@
+# dashboard/modules/result_cache.py
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from modules import optimizer
+from modules.task_table import TaskTable
+
+# Diretório compartilhado por todos os planejadores do servidor
+RESULT_CACHE_DIR = 'data/cache/optimizer'
+# Tamanho máximo do cache em disco; os resultados menos usados recentemente são removidos
+RESULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Incrementar quando a lógica do otimizador mudar, para invalidar resultados antigos
+RESULT_CACHE_VERSION = 5
+
+_lock = threading.Lock()
+
+
+def _json_default(value):
+    """Serialização canônica dos tipos que o json não conhece (Timestamps, escalares NumPy)."""
+    if isinstance(value, (pd.Timestamp, date)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def scenario_key(task_list, config, planning_date=None):
+    """
+    Hash canônico de um cenário: tarefas (lista de lotes ou `TaskTable`) + config + data de início do planejamento.
+    A data entra na chave porque o horizonte de planejamento parte do dia atual.
+    """
+    planning_date = planning_date or date.today()
+    payload = json.dumps(
+        {
+            'version': RESULT_CACHE_VERSION,
+            'date': planning_date.isoformat(),
+            'config': config,
+            'tasks': task_list.content_hash() if isinstance(task_list, TaskTable) else task_list,
+        },
+        sort_keys=True, default=_json_default, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.pkl")
+
+
+def get(key, cache_dir=RESULT_CACHE_DIR):
+    """Retorna o resultado guardado para a chave (ou None) e marca o uso para o LRU."""
+    path = _cache_path(key, cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+        os.utime(path)
+        return result
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def put(key, result, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+    """Grava o resultado de forma atômica e aplica o limite de tamanho do cache."""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = _cache_path(key, cache_dir)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        evict(cache_dir, max_bytes)
+    except OSError:
+        pass
+
+
+def evict(cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+    """Remove os resultados usados há mais tempo até o cache caber em `max_bytes`."""
+    with _lock:
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes: break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+def run_full_optimization_cached(task_list, config, previous_result=None, cache_dir=RESULT_CACHE_DIR, **kwargs):
+    """
+    Executa `optimizer.run_full_optimization` consultando antes o cache em disco.
+    Cenários idênticos (mesmas tarefas, config e data) devolvem o cronograma e as
+    rejeições guardados, sem rodar o otimizador. Em caso de falta, `previous_result`
+    permite a reotimização incremental a partir de um cronograma anterior; esse resultado
+    reparado depende do cronograma anterior, então não é gravado sob a chave do cenário.
+    Demais argumentos (progress_callback, cancel_event, profile_path) são repassados ao
+    otimizador. Um perfil solicitado (profile_path) força a execução, sem consultar o cache;
+    num acerto, as métricas devolvidas são as da execução original, marcadas com `cached`.
+    """
+    key = scenario_key(task_list, config)
+    result = None if kwargs.get('profile_path') else get(key, cache_dir)
+    if result is None:
+        result = optimizer.run_full_optimization(task_list, config, previous_result=previous_result, **kwargs)
+        if previous_result is None:
+            put(key, result, cache_dir)
+    elif getattr(result, 'metrics', None) is not None:
+        result.metrics.cached = True
+    return result
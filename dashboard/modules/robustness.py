@@ -0,0 +1,127 @@
+# dashboard/modules/robustness.py
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from modules import optimizer, timeline, validation
+
+DEFAULT_REPLICAS = 2000
+# Limite de elementos (réplicas x lotes) por bloco de simulação, para conter a memória
+MAX_CHUNK_ELEMENTS = 5_000_000
+
+
+def lognormal_factors(rng, cv, size):
+    """Fatores multiplicativos com média 1 e coeficiente de variação `cv` (lognormal)."""
+    if cv <= 0: return np.ones(size)
+    sigma2 = np.log1p(cv ** 2)
+    return rng.lognormal(-sigma2 / 2, np.sqrt(sigma2), size)
+
+
+def schedule_arrays(cronograma, config, start_date=None):
+    """
+    Vetores de `timeline.timeline_arrays` (dia, minutos de produção e de setup, faixa de
+    lotes de cada dia) mais o grupo (dia, peça) do fornecimento da metalurgia, o consumo
+    acumulado no grupo e o prazo em dias a partir de `start_date` (+inf sem data de entrega).
+    """
+    arr = timeline.timeline_arrays(cronograma, config, start_date)
+    itens, dia = arr['itens'], arr['dia']
+
+    # Fornecimento da metalurgia: limite diário por peça, consumido na ordem da sequência. Com
+    # limites diferentes entre os lotes da peça no dia vale o maior: um dia viável pela regra do
+    # planejamento (`validation.supply_feasible`) consome no total no máximo esse valor
+    df = pd.DataFrame({
+        'dia': dia,
+        'peca': [item['CODIGO_PRODUTO'] for item in itens],
+        'qtd': [item.get('Quantidade_Planejada', 0) for item in itens],
+        'fornecimento': [validation.supply_limit(item, 'FORNECIMENTO_METALURGIA') for item in itens],
+    })
+    grupo, _ = pd.factorize(pd.MultiIndex.from_frame(df[['dia', 'peca']]))
+    consumo = df.groupby(grupo)['qtd'].cumsum().to_numpy(dtype=float)
+    fornecimento_grupo = df.groupby(grupo)['fornecimento'].max().to_numpy(dtype=float)
+
+    start_date = pd.Timestamp(start_date or date.today()).normalize()
+    entrega = pd.to_datetime(pd.Series([item.get('Data_de_Entrega') for item in itens], dtype=object))
+    prazo = ((entrega.dt.normalize() - start_date).dt.days).to_numpy(dtype=float)
+    prazo[np.isnan(prazo)] = np.inf
+    return {**arr, 'grupo': grupo, 'consumo': consumo, 'fornecimento_grupo': fornecimento_grupo, 'prazo': prazo}
+
+
+def _simulate_chunk(arr, capacidade, n, rng, speed_cv, supply_cv):
+    """
+    Uma leva de `n` réplicas, vetorizada (réplicas x lotes):
+    - a velocidade da linha varia por dia (fator sobre os minutos de produção; setup fixo);
+    - o fornecimento da metalurgia varia por (dia, peça); o lote que passa do fornecimento
+      sorteado espera a entrega do dia seguinte (um dia de atraso);
+    - o que passar da capacidade de um dia transborda para os seguintes (fila acumulada).
+    Retorna (minutos de trabalho por dia, falta de metalurgia por lote, atraso por lote).
+    """
+    n_dias = len(arr['fim_dia'])
+    velocidade = lognormal_factors(rng, speed_cv, (n, n_dias))
+    duracao = arr['producao'][None, :] * velocidade[:, arr['dia']] + arr['setup'][None, :]
+    acumulado = np.concatenate((np.zeros((n, 1)), np.cumsum(duracao, axis=1)), axis=1)
+    trabalho = acumulado[:, arr['fim_dia']] - acumulado[:, arr['inicio_dia']]
+
+    # Fila que transborda de um dia para o outro (recorrência sobre os dias, vetorizada nas réplicas)
+    transbordo = np.zeros((n, n_dias))
+    fila = np.zeros(n)
+    for d in range(n_dias):
+        transbordo[:, d] = fila
+        fila = np.maximum(0.0, fila + trabalho[:, d] - capacidade)
+
+    # Minuto em que cada lote termina, contado do início do seu dia (com a fila herdada)
+    termino = transbordo[:, arr['dia']] + acumulado[:, 1:] - acumulado[:, arr['inicio_dia'][arr['dia']]]
+    dias_extras = np.maximum(0.0, np.ceil(termino / capacidade) - 1)
+
+    fornecimento = arr['fornecimento_grupo'][None, :] * lognormal_factors(rng, supply_cv, (n, len(arr['fornecimento_grupo'])))
+    falta = arr['consumo'][None, :] > fornecimento[:, arr['grupo']]
+    atraso = arr['dia'][None, :] + dias_extras + falta > arr['prazo'][None, :]
+    return trabalho, falta, atraso
+
+
+def simulate_schedule(cronograma, config, n_replicas=DEFAULT_REPLICAS, speed_cv=0.1, supply_cv=0.15, seed=0, start_date=None):
+    """
+    Simulação de Monte Carlo da robustez de um cronograma de `run_full_optimization`:
+    reexecuta o cronograma em `n_replicas` cenários sorteados de velocidade da linha
+    (`speed_cv`, por dia) e de fornecimento da metalurgia (`supply_cv`, por dia e peça),
+    todas as réplicas de uma vez em NumPy. `start_date` é a data do dia 1 (padrão: hoje,
+    como no otimizador). Retorna (df_dias, df_lotes) com a probabilidade de cada dia
+    estourar config['daily_capacity'] e de cada lote faltar metalurgia ou perder a
+    'Data_de_Entrega'.
+    """
+    arr = schedule_arrays(cronograma, config, start_date)
+    n_lotes, n_dias = len(arr['itens']), len(cronograma)
+    capacidade = float(config['daily_capacity'])
+    rng = np.random.default_rng(seed)
+    bloco = max(1, MAX_CHUNK_ELEMENTS // max(n_lotes, 1))
+
+    trabalho = np.empty((n_replicas, n_dias))
+    faltas, atrasos = np.zeros(n_lotes), np.zeros(n_lotes)
+    for inicio in range(0, n_replicas, bloco):
+        n = min(bloco, n_replicas - inicio)
+        trabalho[inicio:inicio + n], falta, atraso = _simulate_chunk(arr, capacidade, n, rng, speed_cv, supply_cv)
+        faltas += falta.sum(axis=0)
+        atrasos += atraso.sum(axis=0)
+
+    planejado = np.array([day['time_used_minutes'] for day in cronograma], dtype=float)
+    df_dias = pd.DataFrame({
+        'Dia': [day['day'] for day in cronograma],
+        'Lotes': arr['fim_dia'] - arr['inicio_dia'],
+        'Minutos Planejados': planejado.round(1),
+        'Minutos P50': np.percentile(trabalho, 50, axis=0).round(1),
+        'Minutos P95': np.percentile(trabalho, 95, axis=0).round(1),
+        'Prob. Estouro': (trabalho > capacidade).mean(axis=0),
+    })
+    itens = arr['itens']
+    df_lotes = pd.DataFrame({
+        'Dia': [day['day'] for day in cronograma for _ in day['items']],
+        'Sequencia': arr['sequencia'],
+        'id_tarefa': [item.get('id_tarefa', optimizer.task_id(item)) for item in itens],
+        'CODIGO_COMPONENTE': [item.get('CODIGO_COMPONENTE') for item in itens],
+        'Tinta': [item['Tinta'] for item in itens],
+        'Data_de_Entrega': [item.get('Data_de_Entrega') for item in itens],
+        'Prob. Falta Metalurgia': faltas / n_replicas,
+        'Prob. Atraso': atrasos / n_replicas,
+    })
+    return df_dias, df_lotes
@@ -0,0 +1,188 @@
+# dashboard/modules/setup_matrix.py
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from modules.data_handler import normalize_codigo
+from modules.task_table import TaskTable
+
+# Colunas do CSV da matriz de setup (formato longo: uma linha por par origem -> destino)
+SETUP_MATRIX_COLUMNS = ('ORIGEM', 'DESTINO', 'SETUP_MIN')
+
+# Chave de comparação entre os valores da matriz (texto do CSV) e os dos lotes: os códigos
+# de peça chegam como int64/float64 nos lotes, então os dois lados passam por `normalize_codigo`
+MATRIX_KEYS = {
+    'setup_cor': lambda valor: str(valor).strip().upper(),
+    'setup_peca': normalize_codigo,
+}
+
+# Resultado de `SetupTable.is_metric` por matriz (a verificação é O(k^3) nos valores da matriz)
+_METRIC_CACHE = {}
+
+
+class SetupTable:
+    """
+    Tempos de setup dependentes da sequência (origem -> destino) para um atributo
+    ('Tinta' ou 'CODIGO_PRODUTO'), compilados em uma tabela NumPy indexada por inteiros.
+    Pares ausentes de `overrides` custam `default`; trocar para o mesmo valor custa zero.
+    Para que o agrupamento de lotes idênticos continue sem perda (e o sequenciador exato
+    seja de fato exato), a matriz deve respeitar a desigualdade triangular (ir de A a C
+    direto não custa mais que passar por B); `is_metric` confere.
+    """
+
+    def __init__(self, default, overrides=(), names=()):
+        self.default = default
+        self.overrides = {(origem, destino): float(minutos) for origem, destino, minutos in overrides}
+        self.index = {}
+        self.table = np.zeros((0, 0))
+        self._rows = []
+        self.add(list(names) + [name for pair in self.overrides for name in pair])
+
+    def add(self, names):
+        """Atribui códigos aos valores novos e recompila a tabela (uma vez por lote de nomes)."""
+        novos = [name for name in dict.fromkeys(names) if name not in self.index]
+        if not novos: return
+        for name in novos:
+            self.index[name] = len(self.index)
+        k = len(self.index)
+        table = np.full((k, k), float(self.default))
+        np.fill_diagonal(table, 0.0)
+        for (origem, destino), minutos in self.overrides.items():
+            if origem != destino:
+                table[self.index[origem], self.index[destino]] = minutos
+        self.table, self._rows = table, table.tolist()
+
+    def code(self, name):
+        if name not in self.index: self.add([name])
+        return self.index[name]
+
+    def codes(self, names):
+        names = list(names)
+        self.add(names)
+        return np.array([self.index[name] for name in names], dtype=np.int64)
+
+    def cost(self, origem, destino):
+        """Custo de uma única troca, por consulta à tabela compilada."""
+        i, j = self.code(origem), self.code(destino)
+        return self._rows[i][j]
+
+    def is_metric(self, tol=1e-9):
+        """
+        Confere a desigualdade triangular. Só os valores citados na matriz podem violá-la,
+        junto de um valor qualquer fora dela (custo `default` de e para todos).
+        """
+        chave = (float(self.default), frozenset(self.overrides.items()))
+        if chave not in _METRIC_CACHE:
+            nomes = list(dict.fromkeys(name for pair in self.overrides for name in pair))
+            k = len(nomes)
+            table = np.full((k + 1, k + 1), float(self.default))
+            codes = np.array([self.index[name] for name in nomes], dtype=np.int64)
+            table[:k, :k] = self.table[np.ix_(codes, codes)]
+            np.fill_diagonal(table, 0.0)
+            _METRIC_CACHE[chave] = not any(
+                (table > table[:, [m]] + table[[m], :] + tol).any() for m in range(k + 1)
+            )
+        return _METRIC_CACHE[chave]
+
+
+def code_cost(setup, i, j):
+    """`change_cost` sobre códigos já obtidos com `encode`."""
+    if isinstance(setup, SetupTable): return setup._rows[i][j]
+    return setup if i != j else 0
+
+
+def change_cost(setup, origem, destino):
+    """Custo da troca origem -> destino: consulta à tabela ou custo fixo (`setup` numérico)."""
+    if isinstance(setup, SetupTable): return setup.cost(origem, destino)
+    return setup if origem != destino else 0
+
+
+def pair_cost(setup, x, y):
+    """Versão vetorizada de `change_cost` sobre vetores de códigos (com broadcasting)."""
+    if isinstance(setup, SetupTable): return setup.table[x, y]
+    return setup * (x != y)
+
+
+def encode(setup, names):
+    """Códigos inteiros dos valores: os da tabela, ou códigos locais quando o setup é fixo."""
+    if isinstance(setup, SetupTable): return setup.codes(names)
+    local = {}
+    return np.array([local.setdefault(name, len(local)) for name in names], dtype=np.int64)
+
+
+def load_setup_matrix(file):
+    """
+    Lê o CSV (separador ';') da matriz de setup: colunas ORIGEM, DESTINO e SETUP_MIN.
+    Retorna a lista de [origem, destino, minutos] usada em config['setup_cor_matrix'] /
+    config['setup_peca_matrix'] (uma lista simples, para que o config continue serializável).
+    Os valores ficam como texto; o casamento com os valores dos lotes acontece em `compile_setup_config`.
+    """
+    df = pd.read_csv(file, sep=';', dtype={'ORIGEM': str, 'DESTINO': str})
+    df.columns = df.columns.str.strip().str.upper()
+    faltando = [col for col in SETUP_MATRIX_COLUMNS if col not in df.columns]
+    if faltando:
+        raise ValueError(f"Colunas ausentes na matriz de setup: {', '.join(faltando)}")
+    df = df.dropna(subset=list(SETUP_MATRIX_COLUMNS))
+    origem, destino = df['ORIGEM'].str.strip(), df['DESTINO'].str.strip()
+    return [[o, d, float(m)] for o, d, m in zip(origem, destino, pd.to_numeric(df['SETUP_MIN']))]
+
+
+def align_matrix(matrix, names, key='setup_peca'):
+    """
+    Reescreve origem/destino da matriz com os valores dos lotes (`names`) de mesma chave
+    (`MATRIX_KEYS`), para que '500019' no CSV encontre o código 500019 dos lotes.
+    Retorna (matriz alinhada, chaves da matriz sem nenhum lote correspondente).
+    """
+    normalize = MATRIX_KEYS[key]
+    valores = {}
+    for name in names:
+        valores.setdefault(normalize(name), name)
+    alinhada, sem_lote = [], set()
+    for origem, destino, minutos in matrix:
+        par = []
+        for valor in (normalize(origem), normalize(destino)):
+            if valor not in valores: sem_lote.add(valor)
+            par.append(valores.get(valor, valor))
+        alinhada.append([*par, minutos])
+    return alinhada, sem_lote
+
+
+def matrix_warnings(table, sem_lote=(), rotulo='Matriz de setup'):
+    """Avisos sobre uma matriz compilada: valores sem lotes correspondentes e violação da desigualdade triangular."""
+    avisos = []
+    if sem_lote:
+        exemplos = ', '.join(sorted(map(str, sem_lote))[:5])
+        avisos.append(f"{rotulo}: {len(sem_lote)} valores sem lotes correspondentes (ex.: {exemplos}).")
+    if not table.is_metric():
+        avisos.append(f"{rotulo}: a matriz não respeita a desigualdade triangular; o agrupamento em "
+                      "blocos e o sequenciador exato ficam desativados.")
+    return avisos
+
+
+def compile_setup_config(config, items=()):
+    """
+    Retorna uma cópia do config em que 'setup_cor'/'setup_peca' viram `SetupTable` quando há
+    config['setup_cor_matrix']/config['setup_peca_matrix']; o valor numérico original passa a
+    ser o custo padrão dos pares fora da matriz. Os valores de `items` (lista de lotes ou
+    `TaskTable`) são compilados de uma vez, e a matriz é alinhada a eles (`align_matrix`).
+    Uma matriz fora da desigualdade triangular desliga 'block_compression' e o sequenciador
+    exato ('exact_max_groups' = 0), que só são sem perda / exatos com ela; os problemas da
+    matriz são emitidos com `warnings.warn`. Sem matriz, o config é devolvido como está (custos fixos).
+    """
+    compiled = dict(config)
+    for key, column in (('setup_cor', 'Tinta'), ('setup_peca', 'CODIGO_PRODUTO')):
+        matrix = config.get(f'{key}_matrix')
+        if matrix and not isinstance(config[key], SetupTable):
+            if isinstance(items, TaskTable):
+                names = list(items.codes(column)[1]) if len(items) else []
+            else:
+                names = list(dict.fromkeys(item[column] for item in items))
+            matrix, sem_lote = align_matrix(matrix, names, key)
+            compiled[key] = SetupTable(config[key], matrix, names)
+            if not compiled[key].is_metric():
+                compiled['block_compression'], compiled['exact_max_groups'] = False, 0
+            for aviso in matrix_warnings(compiled[key], sem_lote if names else (), f"{key}_matrix"):
+                warnings.warn(aviso, stacklevel=2)
+    return compiled
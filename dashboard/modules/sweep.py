@@ -0,0 +1,123 @@
+# dashboard/modules/sweep.py
+
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from modules import optimizer, timeline
+
+# Parâmetros que podem variar na varredura (chaves do config do otimizador)
+SWEEP_PARAMETERS = ('horizonte_dias', 'setup_cor', 'setup_peca', 'daily_capacity', 'tabu_tenure')
+# Máximo de processos de uma varredura (cada cenário ocupa um núcleo inteiro)
+MAX_SWEEP_WORKERS = 4
+# Intervalo (s) entre as conferências do cancelamento enquanto os cenários rodam
+CANCEL_POLL_SECONDS = 0.5
+# Objetivos do front de Pareto (todos minimizados)
+PARETO_OBJECTIVES = ('horas_setup', 'dias', 'lotes_rejeitados')
+
+# Tabela de tarefas do processo de trabalho, recebida uma única vez (ver `_init_worker`)
+_tarefas = None
+
+
+def _init_worker(tarefas):
+    global _tarefas
+    _tarefas = tarefas
+
+
+def parse_grid(text, cast=float):
+    """Lê uma grade digitada ('5, 7, 10') como lista de valores distintos, na ordem informada."""
+    valores = [cast(valor) for valor in text.replace(';', ',').split(',') if valor.strip()]
+    return list(dict.fromkeys(valores))
+
+
+def scenario_grid(base_config, grids):
+    """
+    Produto cartesiano das grades (`{parâmetro: [valores]}`) sobre o config base.
+    Parâmetros sem grade mantêm o valor do config base.
+    """
+    nomes = [nome for nome in SWEEP_PARAMETERS if grids.get(nome)]
+    cenarios = []
+    for valores in itertools.product(*(grids[nome] for nome in nomes)):
+        config = dict(base_config, **dict(zip(nomes, valores)))
+        # Cada cenário já ocupa um processo: sem portfólio aninhado
+        config['portfolio_starts'] = 1
+        cenarios.append(config)
+    return cenarios
+
+
+def summarize(cronograma, rejeitados, config):
+    """Indicadores de um cenário (os objetivos do Pareto e as horas de trabalho), pelos KPIs de `timeline`."""
+    kpis = timeline.schedule_kpis(cronograma, config)
+    return {
+        'horas_setup': round(kpis['horas_setup'], 2),
+        'dias': kpis['dias'],
+        'lotes_rejeitados': len(rejeitados),
+        'horas_trabalho': round(kpis['horas_trabalho'], 2),
+    }
+
+
+def _run_scenario(k, config, cancel_event=None):
+    """Um cenário (executado no processo de trabalho, sobre a tabela compartilhada)."""
+    resultado = optimizer.run_full_optimization(_tarefas, config, cancel_event=cancel_event)
+    return k, {**summarize(*resultado, config), 'segundos': round(resultado.metrics.total_seconds, 2)}
+
+
+def pareto_front(values):
+    """
+    Máscara dos pontos não dominados (minimização em todas as colunas de `values`, n x m).
+    Um ponto é dominado se outro é no máximo igual em todos os objetivos e melhor em algum.
+    """
+    values = np.asarray(values, dtype=float)
+    menor_ou_igual = (values[:, None, :] <= values[None, :, :]).all(axis=2)
+    menor = (values[:, None, :] < values[None, :, :]).any(axis=2)
+    # dominado[j]: existe i com values[i] <= values[j] em tudo e < em algum objetivo
+    return ~(menor_ou_igual & menor).any(axis=0)
+
+
+def run_sweep(task_list, base_config, grids, workers=None, progress_callback=None, cancel_event=None):
+    """
+    Roda todos os cenários de `scenario_grid` em um pool de processos ('spawn', como no
+    portfólio do otimizador), com no máximo `MAX_SWEEP_WORKERS` processos. A tabela de
+    tarefas é enviada uma vez a cada processo, no inicializador do pool, e não a cada cenário.
+    `progress_callback(concluídos, total)` é chamado a cada cenário; com `cancel_event`
+    (threading.Event) acionado, os cenários pendentes são descartados e a varredura levanta
+    `optimizer.OptimizationCancelled`. Retorna um DataFrame com os parâmetros variados, os
+    indicadores de cada cenário e a coluna 'pareto' (front de `PARETO_OBJECTIVES`).
+    """
+    tarefas = optimizer.as_task_table(task_list)
+    cenarios = scenario_grid(base_config, grids)
+    workers = max(1, min(workers or os.cpu_count() or 1, MAX_SWEEP_WORKERS, len(cenarios)))
+    resumos = [None] * len(cenarios)
+
+    if workers == 1:
+        _init_worker(tarefas)
+        for k, config in enumerate(cenarios):
+            resumos[k] = _run_scenario(k, config, cancel_event)[1]
+            if progress_callback: progress_callback(k + 1, len(cenarios))
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(tarefas,))
+        try:
+            pendentes = {executor.submit(_run_scenario, k, config) for k, config in enumerate(cenarios)}
+            while pendentes:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise optimizer.OptimizationCancelled()
+                concluidos, pendentes = wait(pendentes, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    k, resumo = futuro.result()
+                    resumos[k] = resumo
+                if concluidos and progress_callback:
+                    progress_callback(len(cenarios) - len(pendentes), len(cenarios))
+        finally:
+            # Cancelamento ou erro: os cenários que ainda não começaram são descartados
+            executor.shutdown(cancel_futures=True)
+
+    nomes = [nome for nome in SWEEP_PARAMETERS if grids.get(nome)]
+    df = pd.DataFrame([{**{nome: config[nome] for nome in nomes}, **resumo} for config, resumo in zip(cenarios, resumos)])
+    if not df.empty:
+        df['pareto'] = pareto_front(df[list(PARETO_OBJECTIVES)].to_numpy())
+    return df
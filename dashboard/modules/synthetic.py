@@ -0,0 +1,80 @@
+# dashboard/modules/synthetic.py
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Paleta usada nas estruturas sintéticas (mesmos nomes de cor do gráfico de Gantt)
+CORES = ['PRETO', 'BRANCO', 'AZUL', 'VERMELHO', 'VERDE', 'AMARELO', 'ROSA', 'LARANJA', 'CINZA', 'ROXO']
+
+
+def generate_structures(n_lots, seed=0):
+    """
+    Tabela de estruturas sintética no esquema real ('Planilha_Estruturas - Produto_Cor_Dim'):
+    produtos com 1 a 4 componentes pintados, até somar exatamente `n_lots` linhas.
+    Com os pedidos de `generate_orders`, cada linha vira exatamente um lote.
+    """
+    rng = np.random.default_rng(seed)
+    n_componentes = rng.integers(1, 5, size=n_lots)
+    produto = np.repeat(np.arange(n_lots), n_componentes)[:n_lots]
+    # Componentes compartilhados entre produtos, com parâmetros técnicos fixos por componente
+    n_pool = max(10, n_lots // 4)
+    componente = np.empty(n_lots, dtype=np.int64)
+    for p, idx in pd.Series(np.arange(n_lots)).groupby(produto).indices.items():
+        componente[idx] = rng.choice(n_pool, size=len(idx), replace=False)
+    pecas_g = rng.choice([1, 2, 4, 6, 8], size=n_pool)
+    estoque_g = rng.choice([20, 50, 100, 200, 400], size=n_pool)
+    espacamento = rng.choice([0.3, 0.5, 0.8, 1.2], size=n_pool)
+    cor = rng.integers(0, len(CORES), size=n_lots)
+    return pd.DataFrame({
+        'CODIGO_PRODUTO': 100000 + produto,
+        'DESCRICAO_PRODUTO': [f'PRODUTO {p}' for p in produto],
+        'Componente': [f'COMP-{c}' for c in componente],
+        'CODIGO_COMPONENTE': 500000 + componente,
+        'DESC_COR': np.array(CORES)[cor],
+        'CODIGO_COR': 1000 + cor,
+        'Peças p/ gancheira': pecas_g[componente],
+        'Estoque Gancheiras': estoque_g[componente],
+        'Espaçamento': espacamento[componente],
+        'PECAS_COM_PROCESSO_ADICIONAL': rng.choice(['Sim', 'Não'], size=n_lots, p=[0.2, 0.8]),
+        'FORNECIMENTO_METALURGIA': rng.integers(500, 2501, size=n_lots),
+        'CAPACIDADE_GAIOLAS': rng.integers(1000, 4001, size=n_lots),
+    })
+
+
+def generate_orders(df_estruturas, seed=0, reference_date=None, horizon_days=60):
+    """
+    Arquivo de pedidos sintético (mesmo esquema do upload da interface): um pedido por
+    produto da estrutura, sempre com necessidade (Pedidos > Estoque), e entregas espalhadas
+    em `horizon_days` dias a partir de `reference_date` (padrão: hoje).
+    """
+    rng = np.random.default_rng(seed + 1)
+    reference_date = reference_date or date.today()
+    produtos = df_estruturas.drop_duplicates('CODIGO_PRODUTO')
+    n = len(produtos)
+    estoque = rng.integers(0, 200, size=n)
+    entrega = [reference_date + timedelta(days=int(d)) for d in rng.integers(0, horizon_days, size=n)]
+    return pd.DataFrame({
+        'CODIGO_PRODUTO': produtos['CODIGO_PRODUTO'].to_numpy(),
+        'DESCRICAO_PRODUTO': produtos['DESCRICAO_PRODUTO'].to_numpy(),
+        'Pedidos': estoque + rng.integers(10, 400, size=n),
+        'Estoque': estoque,
+        'Data_Entrega': [d.strftime('%d/%m/%Y') for d in entrega],
+    })
+
+
+def generate_dataset(n_lots, seed=0, reference_date=None):
+    """Par (estruturas, pedidos) sintético e reprodutível que gera exatamente `n_lots` lotes."""
+    df_estruturas = generate_structures(n_lots, seed)
+    return df_estruturas, generate_orders(df_estruturas, seed, reference_date)
+
+
+def write_dataset(directory, n_lots, seed=0, reference_date=None):
+    """Grava o par sintético nos formatos de arquivo reais (estruturas ';'/latin1, pedidos ',')."""
+    df_estruturas, df_pedidos = generate_dataset(n_lots, seed, reference_date)
+    estruturas_path = f'{directory}/estruturas_{n_lots}.csv'
+    pedidos_path = f'{directory}/pedidos_{n_lots}.csv'
+    df_estruturas.to_csv(estruturas_path, sep=';', index=False, encoding='latin1')
+    df_pedidos.to_csv(pedidos_path, index=False, encoding='latin1')
+    return estruturas_path, pedidos_path
@@ -0,0 +1,134 @@
+# dashboard/modules/task_table.py
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+class _Missing:
+    """Marca de chave ausente em tabelas montadas a partir de dicionários heterogêneos."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+class TaskTable:
+    """
+    Tabela compacta de lotes (struct-of-arrays): uma coluna NumPy por campo, compartilhada
+    entre `data_handler`, `optimizer` e as páginas. O otimizador trabalha com índices
+    inteiros de linha; dicionários por lote só são montados na saída (`records`).
+    A tabela é tratada como imutável: `replace` devolve uma nova tabela que reaproveita
+    as colunas não alteradas, sem cópias.
+    """
+
+    __slots__ = ('_columns', '_n', '_cache')
+
+    def __init__(self, columns, n=None):
+        self._columns = dict(columns)
+        self._n = n if n is not None else (len(next(iter(self._columns.values()))) if self._columns else 0)
+        self._cache = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls({col: df[col].to_numpy() for col in df.columns}, len(df))
+
+    @classmethod
+    def from_records(cls, records):
+        """Monta a tabela a partir de dicionários; os valores são os mesmos objetos (sem cópia)."""
+        records = list(records)
+        keys = list(dict.fromkeys(key for record in records for key in record))
+        columns = {}
+        for key in keys:
+            column = np.empty(len(records), dtype=object)
+            column[:] = [record.get(key, MISSING) for record in records]
+            columns[key] = column
+        return cls(columns, len(records))
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, name):
+        return self._columns[name]
+
+    def replace(self, **columns):
+        """Nova tabela com as colunas informadas trocadas (ou acrescentadas ao fim)."""
+        return TaskTable({**self._columns, **columns}, self._n)
+
+    def numeric(self, name, default=np.nan):
+        """Coluna como float64 (memoizada); campo ausente vira `default`."""
+        key = ('numeric', name, default)
+        if key not in self._cache:
+            if name not in self._columns:
+                values = np.full(self._n, default, dtype=float)
+            else:
+                column = self._columns[name]
+                if column.dtype == object:
+                    column = np.array([default if v is MISSING else v for v in column], dtype=float)
+                values = column.astype(float, copy=False)
+            self._cache[key] = values
+        return self._cache[key]
+
+    def datetimes(self, name):
+        """Coluna de datas como datetime64[ns] (memoizada)."""
+        key = ('datetime', name)
+        if key not in self._cache:
+            self._cache[key] = pd.to_datetime(self._columns[name]).to_numpy(dtype='datetime64[ns]')
+        return self._cache[key]
+
+    def codes(self, name):
+        """Códigos categóricos da coluna: (códigos inteiros por linha, lista de categorias)."""
+        key = ('codes', name)
+        if key not in self._cache:
+            codes, categories = pd.factorize(self._columns[name], use_na_sentinel=False)
+            self._cache[key] = (codes.astype(np.int64, copy=False), list(categories))
+        return self._cache[key]
+
+    def values(self, name):
+        """Coluna inteira como lista de valores nativos do Python."""
+        return self._box(self._columns[name])
+
+    def value(self, name, i, default=MISSING):
+        """Valor de uma célula no tipo nativo do Python (como em `DataFrame.to_dict`)."""
+        if name not in self._columns: return default
+        value = self._box(self._columns[name][i:i + 1])[0]
+        return default if value is MISSING else value
+
+    @staticmethod
+    def _box(values):
+        if values.dtype.kind == 'M':
+            return list(pd.DatetimeIndex(values))
+        return values.tolist()
+
+    def records(self, indices=None):
+        """Materializa os lotes (todos, ou os de `indices`) como dicionários, na ordem das colunas."""
+        indices = np.arange(self._n) if indices is None else np.asarray(indices, dtype=np.int64)
+        names = list(self._columns)
+        boxed = [self._box(self._columns[name][indices]) for name in names]
+        return [{name: v for name, v in zip(names, row) if v is not MISSING} for row in zip(*boxed)]
+
+    def to_frame(self):
+        return pd.DataFrame(self.records(), columns=self.columns) if self._n else pd.DataFrame(columns=self.columns)
+
+    def content_hash(self):
+        """Hash do conteúdo da tabela (nomes, tipos e valores das colunas), para chaves de cache."""
+        h = hashlib.sha256()
+        for name, column in self._columns.items():
+            h.update(repr((name, str(column.dtype))).encode('utf-8'))
+            hashed = pd.util.hash_array(np.array([repr(v) for v in column], dtype=object)) if column.dtype == object else pd.util.hash_array(column)
+            h.update(hashed.tobytes())
+        return h.hexdigest()
@@ -0,0 +1,99 @@
+# dashboard/modules/timeline.py
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from modules import setup_matrix
+from modules.setup_matrix import pair_cost
+
+# Início do turno de cada dia de produção
+WORKDAY_START = pd.Timedelta(hours=5, minutes=10)
+
+# Colunas acrescentadas aos lotes por `build_timeline`
+TIMELINE_COLUMNS = ['Dia', 'Sequencia', 'Setup_Minutos', 'Inicio_Minutos', 'Fim_Minutos', 'Inicio', 'Fim', 'Utilizacao_Acumulada']
+
+
+def timeline_arrays(cronograma, config, start_date=None):
+    """
+    Linha do tempo de todos os lotes, em vetores na ordem de produção (somas acumuladas, sem
+    laço por lote). O setup de cada lote vem da troca a partir do lote anterior, encadeada entre
+    os dias (como em `sequence_schedule`), e acontece antes da produção do lote. Chaves:
+    'itens', 'dia' (0 = primeiro dia), 'inicio_dia'/'fim_dia' (faixa de lotes de cada dia),
+    'sequencia', 'producao', 'setup', 'inicio'/'fim' (minutos desde o início do turno),
+    'utilizacao' (fração acumulada de config['daily_capacity']) e 'inicio_ts'/'fim_ts'
+    (datetime64, dia 1 = `start_date`, padrão hoje, com o turno às WORKDAY_START).
+    """
+    itens = [item for day in cronograma for item in day['items']]
+    tamanhos = np.array([len(day['items']) for day in cronograma], dtype=np.int64)
+    fim_dia = np.cumsum(tamanhos)
+    inicio_dia = fim_dia - tamanhos
+    dia = np.repeat(np.arange(len(cronograma)), tamanhos)
+    producao = np.array([item['Tempo_Calculado_Minutos'] for item in itens], dtype=float)
+
+    setup = np.zeros(len(itens))
+    if len(itens) > 1:
+        config = setup_matrix.compile_setup_config(config, itens)
+        cores = setup_matrix.encode(config['setup_cor'], [item['Tinta'] for item in itens])
+        pecas = setup_matrix.encode(config['setup_peca'], [item['CODIGO_PRODUTO'] for item in itens])
+        setup[1:] = pair_cost(config['setup_cor'], cores[:-1], cores[1:]) + pair_cost(config['setup_peca'], pecas[:-1], pecas[1:])
+
+    acumulado = np.concatenate(([0.0], np.cumsum(setup + producao)))
+    fim = acumulado[1:] - acumulado[inicio_dia[dia]]
+    inicio = fim - producao
+
+    turno = (pd.Timestamp(start_date or date.today()).normalize() + WORKDAY_START).to_datetime64()
+    inicio_turno = turno + dia.astype('timedelta64[D]')
+    return {
+        'itens': itens, 'dia': dia, 'inicio_dia': inicio_dia, 'fim_dia': fim_dia,
+        'sequencia': np.arange(len(itens)) - inicio_dia[dia] + 1,
+        'producao': producao, 'setup': setup, 'inicio': inicio, 'fim': fim,
+        'utilizacao': fim / config['daily_capacity'],
+        'inicio_ts': inicio_turno + (inicio * 60e9).round().astype('timedelta64[ns]'),
+        'fim_ts': inicio_turno + (fim * 60e9).round().astype('timedelta64[ns]'),
+    }
+
+
+def build_timeline(cronograma, config, start_date=None):
+    """Um DataFrame com os campos de cada lote mais as colunas de `TIMELINE_COLUMNS` (base do Gantt e das exportações)."""
+    arr = timeline_arrays(cronograma, config, start_date)
+    df = pd.DataFrame(arr['itens'])
+    numeros = np.array([day['day'] for day in cronograma], dtype=np.int64)
+    colunas = {
+        'Dia': numeros[arr['dia']], 'Sequencia': arr['sequencia'], 'Setup_Minutos': arr['setup'],
+        'Inicio_Minutos': arr['inicio'], 'Fim_Minutos': arr['fim'],
+        'Inicio': arr['inicio_ts'], 'Fim': arr['fim_ts'], 'Utilizacao_Acumulada': arr['utilizacao'],
+    }
+    campos = [col for col in df.columns if col not in TIMELINE_COLUMNS]
+    return pd.concat([pd.DataFrame(colunas), df[campos]], axis=1)
+
+
+def day_summary(cronograma, config, start_date=None):
+    """Indicadores por dia: lotes, minutos de produção e de setup, tempo total, utilização e trocas de peça."""
+    arr = timeline_arrays(cronograma, config, start_date)
+    componentes = pd.factorize(pd.Series([item.get('CODIGO_COMPONENTE') for item in arr['itens']], dtype=object))[0]
+    troca = np.zeros(len(componentes), dtype=np.int64)
+    troca[1:] = (componentes[1:] != componentes[:-1]) & (arr['dia'][1:] == arr['dia'][:-1])
+    n_dias = len(cronograma)
+    producao = np.bincount(arr['dia'], arr['producao'], minlength=n_dias)
+    setup = np.bincount(arr['dia'], arr['setup'], minlength=n_dias)
+    return pd.DataFrame({
+        'Dia': [day['day'] for day in cronograma],
+        'Lotes': arr['fim_dia'] - arr['inicio_dia'],
+        'Producao_Minutos': producao,
+        'Setup_Minutos': setup,
+        'Tempo_Total_Minutos': producao + setup,
+        'Utilizacao': (producao + setup) / config['daily_capacity'],
+        'Trocas_de_Peca': np.bincount(arr['dia'], troca, minlength=n_dias).astype(np.int64),
+    })
+
+
+def schedule_kpis(cronograma, config):
+    """KPIs do cronograma inteiro: dias de produção, horas de setup e horas de trabalho."""
+    arr = timeline_arrays(cronograma, config)
+    return {
+        'dias': len(cronograma),
+        'horas_setup': arr['setup'].sum().item() / 60,
+        'horas_trabalho': (arr['setup'].sum() + arr['producao'].sum()).item() / 60,
+    }
@@ -0,0 +1,111 @@
+# dashboard/modules/validation.py
+
+import numpy as np
+import pandas as pd
+
+from modules import setup_matrix
+from modules.setup_matrix import pair_cost
+
+# Comprimento da monovia: abaixo dele as gancheiras não voltam a tempo de serem reutilizadas
+MONOVIA_LENGHT_METERS = 168
+
+# Motivos de violação (os mesmos textos das rejeições do planejamento)
+MSG_GANCHEIRAS = "Gancheiras Insuficientes ({} > {}) e Monovia Curta"
+MSG_METALURGIA = "Excede Fornecimento Metalurgia (Max: {})"
+MSG_GAIOLAS = "Excede Capacidade Gaiolas (Max: {})"
+MSG_TEMPO = "Excede Tempo de Produção do Dia"
+MSG_DUPLICADO = "Lote Planejado em Mais de um Dia"
+
+VIOLATION_COLUMNS = ['Dia', 'Sequencia', 'id_tarefa', 'Restricao', 'Motivo']
+
+
+def hanger_shortage(quantidade, pecas_por_gancheira, estoque_gancheira, distancia_m):
+    """
+    Restrição de gancheiras (escalares ou vetores): retorna (gancheiras necessárias, violação).
+    Viola quando faltam gancheiras e a monovia é curta demais para reutilizá-las.
+    """
+    gancheiras = np.ceil(np.asarray(quantidade, dtype=float) / pecas_por_gancheira)
+    return gancheiras, (gancheiras > estoque_gancheira) & (gancheiras * distancia_m <= MONOVIA_LENGHT_METERS)
+
+
+def supply_limit(item, nome):
+    """Limite de um lote em `nome` ('FORNECIMENTO_METALURGIA' ou 'CAPACIDADE_GAIOLAS'); ausente ou NaN = sem limite."""
+    valor = item.get(nome)
+    return float('inf') if valor is None or pd.isna(valor) else float(valor)
+
+
+def supply_feasible(lotes, nomes=('FORNECIMENTO_METALURGIA', 'CAPACIDADE_GAIOLAS')):
+    """
+    True se os lotes de uma mesma peça em um dia cabem nos limites `nomes`. O planejamento
+    confere cada lote ao entrar no dia (consumo acumulado da peça <= limite do próprio lote);
+    o conjunto é viável se alguma ordem passa nessa regra, e a melhor ordem é a de limite
+    crescente (como prazos: a regra de Jackson). A resposta não depende da ordem dos lotes.
+    """
+    for nome in nomes:
+        consumo = 0
+        for limite, qtd in sorted((supply_limit(lote, nome), lote['Quantidade_Planejada']) for lote in lotes):
+            consumo += qtd
+            if consumo > limite: return False
+    return True
+
+
+def validate_schedule(cronograma, config):
+    """
+    Confere um cronograma de vários dias contra todas as restrições, de uma vez, com
+    agrupamentos vetorizados (sem laço por lote):
+    - gancheiras: estoque de gancheiras x monovia (`hanger_shortage`);
+    - metalurgia e gaiolas: a regra dos filtros diários de `create_initial_schedule` (consumo
+      acumulado da peça no dia <= limite do lote) conferida na ordem de limite crescente, a
+      mais favorável (`supply_feasible`). Assim a verificação não depende da sequência do dia:
+      reordenar um dia viável do estágio 1 não gera violação;
+    - tempo: produção + setup acumulados no dia contra config['daily_capacity'] (setup
+      contado dentro do dia, como no planejamento e no reparo);
+    - duplicidade: o mesmo lote (id_tarefa) em mais de um dia.
+    Serve para o resultado da busca tabu, da partida a quente e de edições manuais.
+    Retorna um DataFrame com uma linha por violação (colunas `VIOLATION_COLUMNS`).
+    """
+    itens = [item for day in cronograma for item in day['items']]
+    if not itens: return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    dias = np.repeat([day['day'] for day in cronograma], [len(day['items']) for day in cronograma])
+
+    def coluna(nome, padrao=np.nan):
+        return pd.to_numeric(pd.Series([item.get(nome, padrao) for item in itens]), errors='coerce').to_numpy(dtype=float)
+
+    df = pd.DataFrame({
+        'Dia': dias,
+        'id_tarefa': [item.get('id_tarefa') or f"{item['CODIGO_PRODUTO_FINAL']}_{item['CODIGO_COMPONENTE']}_{item['Tinta']}" for item in itens],
+        'peca': [item['CODIGO_PRODUTO'] for item in itens],
+        'qtd': coluna('Quantidade_Planejada', 0),
+    })
+    df['Sequencia'] = df.groupby('Dia', sort=False).cumcount() + 1
+    violacoes = []
+
+    def registrar(mascara, restricao, motivos):
+        idx = np.flatnonzero(mascara)
+        if len(idx):
+            violacoes.append(df.iloc[idx][['Dia', 'Sequencia', 'id_tarefa']].assign(Restricao=restricao, Motivo=motivos(idx)))
+
+    gancheiras, falta = hanger_shortage(df['qtd'].to_numpy(), coluna('Pecas_por_Gancheira'), coluna('ESTOQUE_GANCHEIRA'), coluna('DISTANCIA_M'))
+    registrar(falta, 'gancheiras', lambda idx: [MSG_GANCHEIRAS.format(int(gancheiras[i]), itens[i]['ESTOQUE_GANCHEIRA']) for i in idx])
+
+    for nome, restricao, mensagem in (('FORNECIMENTO_METALURGIA', 'metalurgia', MSG_METALURGIA),
+                                      ('CAPACIDADE_GAIOLAS', 'gaiolas', MSG_GAIOLAS)):
+        df['limite'] = np.nan_to_num(coluna(nome, np.inf), nan=np.inf)
+        # Consumo acumulado de cada grupo (dia, peça) na ordem de limite crescente
+        ordem = df.sort_values(['Dia', 'peca', 'limite'], kind='stable')
+        consumo = ordem.groupby(['Dia', 'peca'], sort=False)['qtd'].cumsum().reindex(df.index).to_numpy()
+        registrar(consumo > df['limite'].to_numpy(), restricao,
+                  lambda idx: [mensagem.format(itens[i].get(nome, float('inf'))) for i in idx])
+
+    config = setup_matrix.compile_setup_config(config, itens)
+    cores = setup_matrix.encode(config['setup_cor'], [item['Tinta'] for item in itens])
+    pecas = setup_matrix.encode(config['setup_peca'], [item['CODIGO_PRODUTO'] for item in itens])
+    setup = np.zeros(len(itens))
+    setup[1:] = (pair_cost(config['setup_cor'], cores[:-1], cores[1:]) + pair_cost(config['setup_peca'], pecas[:-1], pecas[1:])) * (dias[1:] == dias[:-1])
+    tempo = pd.Series(np.nan_to_num(coluna('Tempo_Calculado_Minutos')) + setup).groupby(dias).cumsum().to_numpy()
+    registrar(tempo > config['daily_capacity'] + 1e-9, 'tempo', lambda idx: [MSG_TEMPO] * len(idx))
+
+    registrar(df.groupby('id_tarefa')['Dia'].transform('nunique').to_numpy() > 1, 'duplicado', lambda idx: [MSG_DUPLICADO] * len(idx))
+
+    if not violacoes: return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    return pd.concat(violacoes, ignore_index=True).sort_values(['Dia', 'Sequencia'], kind='stable', ignore_index=True)[VIOLATION_COLUMNS]
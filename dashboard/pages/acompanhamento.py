@@ -2,6 +2,7 @@
 
 import streamlit as st
 import pandas as pd
+from modules import timeline
 
 def render_page():
     """Renderiza o Painel de Pulso Operacional para acompanhamento da produção."""
@@ -81,15 +82,12 @@ def render_page():
         st.markdown("---")
 
         # --- Outras métricas adicionais ---
-        total_horas_trabalho = dados_dia.get('time_used_minutes', 0) / 60
-        total_horas_setup = dados_dia.get('setup_cost', 0) / 60
-
-        # Conta quantas vezes houve troca de peça no dia
-        mudancas_de_peca = 0
-        if len(df_dia) > 1:
-            for i in range(len(df_dia) - 1):
-                if df_dia.iloc[i]['CODIGO_COMPONENTE'] != df_dia.iloc[i+1]['CODIGO_COMPONENTE']:
-                    mudancas_de_peca += 1
+        # Horas e trocas de peça pela linha do tempo compartilhada com o Planejamento
+        resumo_dias = timeline.day_summary(cronograma, st.session_state['config_final'])
+        resumo_dia = resumo_dias[resumo_dias['Dia'] == dia_selecionado_num].iloc[0]
+        total_horas_trabalho = resumo_dia['Tempo_Total_Minutos'] / 60
+        total_horas_setup = resumo_dia['Setup_Minutos'] / 60
+        mudancas_de_peca = int(resumo_dia['Trocas_de_Peca'])
         
         # Exibe métricas adicionais
         kpi4, kpi5, kpi6 = st.columns(3)
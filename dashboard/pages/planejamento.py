@@ -2,21 +2,229 @@
 
 import streamlit as st
 import pandas as pd
-from modules import data_handler, optimizer
+from modules import data_handler, diagnostics, jobs, optimizer, robustness, setup_matrix, sweep, timeline, validation
+from modules.task_table import TaskTable
 import io
+import math
+import os
+import time
+import uuid
 from datetime import datetime
 
+
+@st.cache_resource
+def get_job_runner():
+    """Pool de otimizações compartilhado por todas as sessões do servidor."""
+    return jobs.JobRunner()
+
+
+# Intervalo (s) entre as atualizações do progresso de um job em segundo plano
+JOB_POLL_SECONDS = 0.5
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_job_progress(runner, owner, job_id):
+    """
+    Progresso e cancelamento de um job em andamento. Só o fragmento é reexecutado a cada
+    `JOB_POLL_SECONDS`; ao terminar, a página inteira roda de novo para exibir o resultado.
+    """
+    job = runner.get(owner, job_id)
+    if job is None or job.finished:
+        st.rerun()
+    if job.kind == jobs.KIND_SWEEP:
+        texto = f"Varredura ({job.status}): {job.days_planned}/{job.total_days} cenários otimizados"
+    else:
+        texto = (f"Otimizando {job.n_tasks} lotes ({job.status}): {job.days_planned}/{job.total_days} dias | "
+                 f"setup acumulado: {job.setup_cost} min")
+    st.progress(job.fraction, text=texto)
+    rotulo = "⏹️ Cancelar Varredura" if job.kind == jobs.KIND_SWEEP else "⏹️ Cancelar Otimização"
+    if st.button(rotulo, use_container_width=True, disabled=job.cancel_event.is_set()):
+        runner.cancel(owner, job_id)
+
+
+def render_job_status(runner, owner):
+    """Acompanha a otimização em segundo plano da sessão: progresso, cancelamento e resultado."""
+    job_id = st.session_state.get('job_otimizacao')
+    if not job_id:
+        return
+    job = runner.get(owner, job_id)
+    if job is None:
+        del st.session_state['job_otimizacao']
+        return
+
+    if not job.finished:
+        render_job_progress(runner, owner, job_id)
+        return
+
+    if job.status == jobs.STATUS_DONE:
+        cronograma, rejeitados = job.result
+        st.session_state['cronograma_final'] = cronograma
+        st.session_state['tarefas_rejeitadas'] = rejeitados
+        st.session_state['metricas_execucao'] = getattr(job.result, 'metrics', None)
+        st.session_state['config_final'] = job.config
+        st.session_state.pop('robustez', None)
+        st.success("Otimização concluída!")
+    elif job.status == jobs.STATUS_CANCELLED:
+        st.warning("Otimização cancelada.")
+    else:
+        st.error("Falha na otimização.")
+        with st.expander("Detalhes do erro"):
+            st.code(job.error)
+    runner.release(owner, job_id)
+    del st.session_state['job_otimizacao']
+
+def render_diagnostics(metricas):
+    """Seção recolhível com as métricas da última execução do otimizador (`diagnostics.RunMetrics`)."""
+    with st.expander("Diagnóstico da Execução"):
+        if metricas.cached:
+            st.info("Resultado reaproveitado do cache: os números são os da execução original.")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Pré-processamento", f"{metricas.preprocessing_seconds:.2f} s")
+        col2.metric("Reparo do Cronograma" if metricas.warm_start else "Planejamento Inicial", f"{metricas.initial_schedule_seconds:.2f} s")
+        col3.metric("Sequenciamento (Busca Tabu)", f"{metricas.sequencing_seconds:.2f} s")
+        col4.metric("Tempo Total", f"{metricas.total_seconds:.2f} s")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Vizinhos Avaliados", f"{metricas.total('neighbors_evaluated'):,}".replace(',', '.'))
+        col2.metric("Rejeições Tabu", f"{metricas.total('tabu_rejections'):,}".replace(',', '.'))
+        col3.metric("Iterações com Melhora", f"{metricas.total('improving_iterations')} de {metricas.total('iterations')}")
+        col4.metric("Setup (antes → depois)", f"{metricas.setup_after:.0f} min", delta=f"{metricas.setup_after - metricas.setup_before:.0f} min", delta_color="inverse")
+        if metricas.violations is not None and len(metricas.violations):
+            st.warning(f"O cronograma final saiu do otimizador com {len(metricas.violations)} violações de restrição (ver Validação do Cronograma).")
+        if metricas.days:
+            st.dataframe(metricas.to_frame(), use_container_width=True, hide_index=True)
+        if metricas.profile_path and os.path.exists(metricas.profile_path):
+            st.caption("Perfil cProfile (funções por tempo acumulado)")
+            st.code(diagnostics.profile_summary(metricas.profile_path), language=None)
+            with open(metricas.profile_path, 'rb') as f:
+                st.download_button("📥 Baixar Perfil (.prof)", f.read(), os.path.basename(metricas.profile_path))
+
+def render_validation(cronograma, config):
+    """Reconfere o cronograma atual contra todas as restrições (rápido o bastante para cada rerun)."""
+    violacoes = validation.validate_schedule(cronograma, config)
+    with st.container(border=True):
+        st.subheader("Validação do Cronograma")
+        if violacoes.empty:
+            st.success("Todas as restrições atendidas: gancheiras, metalurgia, gaiolas, tempo diário e lotes sem duplicidade.")
+            return
+        st.error(f"{len(violacoes)} violações de restrição em {violacoes['id_tarefa'].nunique()} lotes.")
+        st.dataframe(violacoes, use_container_width=True, hide_index=True)
+
+def render_robustness(cronograma, config):
+    """Seção recolhível da simulação de Monte Carlo do cronograma (`robustness.simulate_schedule`)."""
+    with st.expander("Robustez do Cronograma (Simulação de Monte Carlo)"):
+        st.caption("Reexecuta o cronograma com velocidade da linha (por dia) e fornecimento da metalurgia "
+                   "(por dia e peça) sorteados. Lotes sem metalurgia esperam a entrega do dia seguinte.")
+        col1, col2, col3, col4 = st.columns(4)
+        replicas = col1.number_input("Réplicas", min_value=100, max_value=100000, value=robustness.DEFAULT_REPLICAS, step=500)
+        cv_velocidade = col2.number_input("Variação da Velocidade (%)", min_value=0.0, max_value=100.0, value=10.0) / 100
+        cv_metalurgia = col3.number_input("Variação da Metalurgia (%)", min_value=0.0, max_value=100.0, value=15.0) / 100
+        semente = col4.number_input("Semente", min_value=0, value=0)
+        if st.button("Simular Robustez", use_container_width=True):
+            inicio = time.perf_counter()
+            st.session_state['robustez'] = robustness.simulate_schedule(
+                cronograma, config, int(replicas), cv_velocidade, cv_metalurgia, int(semente)
+            ) + (time.perf_counter() - inicio,)
+
+        if 'robustez' not in st.session_state: return
+        df_dias, df_lotes, segundos = st.session_state['robustez']
+        kpi1, kpi2, kpi3 = st.columns(3)
+        kpi1.metric("Dias com Risco de Estouro (> 10%)", f"{(df_dias['Prob. Estouro'] > 0.1).sum()} de {len(df_dias)}")
+        kpi2.metric("Atrasos Esperados (lotes)", f"{df_lotes['Prob. Atraso'].sum():.1f}")
+        kpi3.metric("Faltas de Metalurgia Esperadas (lotes)", f"{df_lotes['Prob. Falta Metalurgia'].sum():.1f}")
+        st.caption(f"Simulação concluída em {segundos:.2f} s.")
+        st.bar_chart(df_dias, x='Dia', y='Prob. Estouro')
+        formato = {'Prob. Estouro': st.column_config.ProgressColumn("Prob. Estouro", format="%.2f", min_value=0, max_value=1)}
+        st.dataframe(df_dias, use_container_width=True, hide_index=True, column_config=formato)
+        st.markdown("**Lotes com maior risco de atraso**")
+        df_risco = df_lotes[df_lotes['Prob. Atraso'] > 0].sort_values('Prob. Atraso', ascending=False)
+        df_risco = df_risco.assign(Data_de_Entrega=pd.to_datetime(df_risco['Data_de_Entrega']).dt.strftime('%d/%m/%Y'))
+        st.dataframe(df_risco, use_container_width=True, hide_index=True, column_config={
+            col: st.column_config.ProgressColumn(col, format="%.2f", min_value=0, max_value=1)
+            for col in ('Prob. Atraso', 'Prob. Falta Metalurgia')
+        })
+
+# Parâmetros da varredura: rótulo e tipo dos valores digitados
+SWEEP_LABELS = {
+    'horizonte_dias': ("Horizonte (dias)", int),
+    'setup_cor': ("Setup de Cor (min)", float),
+    'setup_peca': ("Setup de Peça (min)", float),
+    'daily_capacity': ("Capacidade Diária (min)", float),
+    'tabu_tenure': ("Duração Tabu", int),
+}
+
+def render_sweep_status(runner, owner):
+    """Acompanha a varredura em segundo plano da sessão: progresso, cancelamento e resultado."""
+    job_id = st.session_state.get('job_varredura')
+    if not job_id:
+        return
+    job = runner.get(owner, job_id)
+    if job is None:
+        del st.session_state['job_varredura']
+        return
+
+    if not job.finished:
+        render_job_progress(runner, owner, job_id)
+        return
+
+    if job.status == jobs.STATUS_DONE:
+        st.session_state['varredura'] = job.result
+    elif job.status == jobs.STATUS_CANCELLED:
+        st.warning("Varredura cancelada.")
+    else:
+        st.error("Falha na varredura.")
+        with st.expander("Detalhes do erro"):
+            st.code(job.error)
+    runner.release(owner, job_id)
+    del st.session_state['job_varredura']
+
+
+def render_sweep(runner, sessao_id, df_calibrado, config):
+    """Varredura de cenários: grades de parâmetros rodadas em segundo plano e o front de Pareto dos resultados."""
+    with st.expander("Varredura de Cenários (Front de Pareto)"):
+        st.caption("Valores separados por vírgula. Cada combinação é um cenário, otimizado com os demais parâmetros acima.")
+        grades = {}
+        for coluna, (chave, (rotulo, tipo)) in zip(st.columns(len(SWEEP_LABELS)), SWEEP_LABELS.items()):
+            texto = coluna.text_input(rotulo, value=str(config[chave]), key=f"grade_{chave}")
+            try:
+                grades[chave] = sweep.parse_grid(texto, tipo)
+            except ValueError:
+                coluna.error("Valores inválidos.")
+                return
+        n_cenarios = math.prod(len(valores) or 1 for valores in grades.values())
+        if st.button(f"Executar Varredura ({n_cenarios} cenários)", use_container_width=True):
+            # Roda no pool de otimizações, respeitando o limite de jobs simultâneos do servidor
+            st.session_state['job_varredura'] = runner.submit_sweep(
+                sessao_id, TaskTable.from_frame(df_calibrado), config, grades
+            )
+        render_sweep_status(runner, sessao_id)
+
+        df_varredura = st.session_state.get('varredura')
+        if df_varredura is None or df_varredura.empty: return
+        front = df_varredura[df_varredura['pareto']].sort_values(list(sweep.PARETO_OBJECTIVES))
+        st.markdown(f"**Front de Pareto**: {len(front)} de {len(df_varredura)} cenários não são dominados "
+                    "em horas de setup, dias utilizados e lotes rejeitados.")
+        st.dataframe(front.drop(columns='pareto'), use_container_width=True, hide_index=True)
+        st.scatter_chart(
+            df_varredura.assign(Cenario=df_varredura['pareto'].map({True: 'Pareto', False: 'Dominado'})),
+            x='dias', y='horas_setup', color='Cenario', size='lotes_rejeitados'
+        )
+        if st.checkbox("Mostrar todos os cenários", key="varredura_todos"):
+            st.dataframe(df_varredura, use_container_width=True, hide_index=True)
+
 def render_page():
     """Renderiza a página de planejamento com a lógica de adição manual corrigida."""
     
     # --- 1. INICIALIZAÇÃO E CARGA DE DADOS ---
-    df_estruturas = st.session_state.get('df_estruturas')
-    if df_estruturas is None:
+    # Base de estruturas compartilhada (já normalizada e indexada, somente leitura)
+    estruturas = st.session_state.get('estruturas')
+    if estruturas is None:
         st.error("Dados de estruturas não carregados. Por favor, reinicie a aplicação.")
         st.stop()
 
-    if 'df_estruturas' in st.session_state and 'CODIGO_PRODUTO' in st.session_state.df_estruturas.columns:
-        st.session_state.df_estruturas['CODIGO_PRODUTO_STR'] = st.session_state.df_estruturas['CODIGO_PRODUTO'].astype('Int64').astype(str)
+    # Pool de otimizações em segundo plano e identificador desta sessão
+    runner = get_job_runner()
+    if 'sessao_id' not in st.session_state: st.session_state.sessao_id = uuid.uuid4().hex
+    sessao_id = st.session_state.sessao_id
 
     # Inicializa os estados da sessão
     if 'manual_orders' not in st.session_state: st.session_state.manual_orders = pd.DataFrame()
@@ -56,7 +264,7 @@ def render_page():
         descricao_encontrada = ""
         produto_valido = False
         if codigo_produto_input:
-            match = df_estruturas[df_estruturas['CODIGO_PRODUTO_STR'] == codigo_produto_input.strip()]
+            match = estruturas.lookup(codigo_produto_input)
             if not match.empty:
                 descricao_encontrada = match['DESCRICAO_PRODUTO'].iloc[0]
                 produto_valido = True
@@ -110,14 +318,8 @@ def render_page():
         if df_pedidos_fonte.empty:
             st.info("Nenhum pedido carregado ou adicionado ainda. Use as abas anteriores para fornecer os dados.")
         else:
-            # Prepara o stream de dados para o data_handler
-            csv_buffer = io.StringIO()
-            df_pedidos_fonte.to_csv(csv_buffer, index=False, sep=',')
-            csv_buffer.seek(0)
-            pedidos_input_stream = io.BytesIO(csv_buffer.read().encode('latin1'))
-            
-            # Gera a lista de tarefas preliminares
-            tarefas_iniciais = data_handler.prepare_task_list(pedidos_input_stream, df_estruturas)
+            # Gera a tabela de tarefas preliminares (memoizada pelo conteúdo dos pedidos e das estruturas)
+            tarefas_iniciais = data_handler.prepare_task_table_cached(df_pedidos_fonte, estruturas)
             
             if not tarefas_iniciais:
                  st.warning("Nenhuma tarefa com necessidade de produção (Pedidos > Estoque) foi encontrada nos dados fornecidos.")
@@ -125,7 +327,7 @@ def render_page():
                 st.markdown("#### Mesa de Calibração")
                 st.info("Ajuste as regras de negócio abaixo para refletir a realidade da fábrica antes de otimizar.", icon="✍️")
                 
-                df_para_calibrar = pd.DataFrame(tarefas_iniciais)
+                df_para_calibrar = tarefas_iniciais.to_frame()
                 df_para_calibrar['PECAS_COM_PROCESSO_ADICIONAL'] = df_para_calibrar['PECAS_COM_PROCESSO_ADICIONAL'].apply(lambda x: True if x == 'Sim' else False)
                 
                 df_calibrado = st.data_editor(
@@ -150,16 +352,65 @@ def render_page():
                         'setup_peca': st.number_input("Setup de Peça (min)", value=3),
                         'daily_capacity': st.number_input("Capacidade Diária (min)", value=1115),
                         'tabu_tenure': st.number_input("Duração Tabu", value=7),
-                        'max_iterations': st.number_input("Iterações Máximas", value=100)
+                        'max_iterations': st.number_input("Iterações Máximas", value=100),
+                        'max_stall_iterations': st.number_input("Iterações sem Melhora (parada antecipada)", min_value=1, value=20),
+                        'max_seconds': st.number_input("Tempo Máximo de Otimização (s)", min_value=1, value=30),
+                        'neighborhoods': st.multiselect(
+                            "Movimentos da Busca Tabu",
+                            options=['swap', 'insertion', 'or_opt', 'two_opt'],
+                            default=['swap', 'insertion', 'or_opt', 'two_opt'],
+                            help="swap: troca de dois lotes | insertion: move um lote | or_opt: move um bloco de até 3 lotes | two_opt: inverte um trecho"
+                        ),
+                        'portfolio_starts': st.number_input("Partidas Paralelas da Busca Tabu (portfólio)", min_value=1, max_value=64, value=1),
+                        'vectorized_search': st.checkbox("Avaliação Vetorizada da Vizinhança (NumPy)", value=True),
+                        'block_compression': st.checkbox("Agrupar Lotes Idênticos (Tinta + Peça) em Blocos", value=True),
+                        'exact_max_groups': st.number_input("Máx. de Grupos para o Sequenciador Exato", min_value=0, max_value=16, value=12)
                     }
+                    # Setup dependente da sequência (ex.: clara -> escura é mais rápido que escura -> clara)
+                    st.caption("Matrizes de setup opcionais (.csv com ';' e colunas ORIGEM, DESTINO, SETUP_MIN). Pares fora da matriz usam os setups fixos acima.")
+                    col_matriz1, col_matriz2 = st.columns(2)
+                    for coluna, base, campo, rotulo in ((col_matriz1, 'setup_cor', 'Tinta', "Matriz de Setup de Cor"),
+                                                        (col_matriz2, 'setup_peca', 'CODIGO_PRODUTO', "Matriz de Setup de Peça")):
+                        chave = f'{base}_matrix'
+                        arquivo_matriz = coluna.file_uploader(rotulo, type=['csv'], key=f"uploader_{chave}")
+                        if arquivo_matriz:
+                            try:
+                                config[chave] = setup_matrix.load_setup_matrix(arquivo_matriz)
+                                coluna.success(f"{len(config[chave])} pares carregados.")
+                                # Confere a matriz contra os lotes calibrados (chaves sem lotes, desigualdade triangular)
+                                alinhada, sem_lote = setup_matrix.align_matrix(config[chave], df_calibrado[campo].unique(), base)
+                                for aviso in setup_matrix.matrix_warnings(setup_matrix.SetupTable(config[base], alinhada), sem_lote, rotulo):
+                                    coluna.warning(aviso)
+                            except (ValueError, pd.errors.ParserError) as e:
+                                coluna.error(f"Matriz de setup inválida: {e}")
+
+                reotimizacao_incremental = st.checkbox(
+                    "Reaproveitar o cronograma anterior (reotimização incremental)",
+                    value=False,
+                    help="Repara apenas os dias afetados pelas mudanças nos pedidos ou na calibração. "
+                         "Com horizonte, capacidade ou setups diferentes dos do cronograma anterior, roda do zero."
+                )
+                gerar_perfil = st.checkbox(
+                    "Gerar perfil de execução (cProfile)",
+                    value=False,
+                    help="Roda sem consultar o cache de resultados e mostra as funções mais custosas no Diagnóstico da Execução."
+                )
 
                 if st.button("Gerar Cronograma Otimizado", type="primary", use_container_width=True):
-                    tarefas_para_otimizar = df_calibrado.to_dict('records')
-                    with st.spinner(f"Otimizando {len(tarefas_para_otimizar)} lotes..."):
-                        cronograma, rejeitados = optimizer.run_full_optimization(tarefas_para_otimizar, config)
-                        st.session_state['cronograma_final'] = cronograma
-                        st.session_state['tarefas_rejeitadas'] = rejeitados
-                    st.success("Otimização concluída!")
+                    tarefas_para_otimizar = TaskTable.from_frame(df_calibrado)
+                    resultado_anterior = None
+                    if reotimizacao_incremental and st.session_state.get('cronograma_final'):
+                        if optimizer.warm_start_compatible(st.session_state.get('config_final'), config):
+                            resultado_anterior = (st.session_state['cronograma_final'], st.session_state.get('tarefas_rejeitadas', []))
+                        else:
+                            st.info("Parâmetros de planejamento alterados: o cronograma será gerado do zero.")
+                    # Executa em segundo plano; `render_job_progress` acompanha o progresso
+                    st.session_state['job_otimizacao'] = runner.submit(
+                        sessao_id, tarefas_para_otimizar, config, previous_result=resultado_anterior, profile=gerar_perfil
+                    )
+
+                render_job_status(runner, sessao_id)
+                render_sweep(runner, sessao_id, df_calibrado, config)
 
     # --- Seção de Resultados ---
     if 'cronograma_final' in st.session_state and st.session_state['cronograma_final']:
@@ -167,6 +418,7 @@ def render_page():
         st.header("Análise dos Resultados")
         cronograma = st.session_state['cronograma_final']
         rejeitados = st.session_state.get('tarefas_rejeitadas', [])
+        config_final = st.session_state.get('config_final')
 
         if rejeitados:
             with st.container(border=True):
@@ -183,23 +435,39 @@ def render_page():
 
         with st.container(border=True):
             st.subheader("Indicadores Chave de Performance (KPIs)")
-            total_dias = len(cronograma)
-            total_setup = sum(day['setup_cost'] for day in cronograma) / 60
-            total_trabalho = sum(day['time_used_minutes'] for day in cronograma) / 60
+            # Mesma linha do tempo do Gantt e das exportações (setup encadeado entre os dias)
+            kpis = timeline.schedule_kpis(cronograma, config_final)
             kpi1, kpi2, kpi3 = st.columns(3)
-            kpi1.metric("Dias de Produção", f"{total_dias} dias")
-            kpi2.metric("Total Horas de Setup", f"{total_setup:.2f} h")
-            kpi3.metric("Total Horas de Trabalho", f"{total_trabalho:.2f} h")
+            kpi1.metric("Dias de Produção", f"{kpis['dias']} dias")
+            kpi2.metric("Total Horas de Setup", f"{kpis['horas_setup']:.2f} h")
+            kpi3.metric("Total Horas de Trabalho", f"{kpis['horas_trabalho']:.2f} h")
+
+        if config_final:
+            render_validation(cronograma, config_final)
+        metricas = st.session_state.get('metricas_execucao')
+        if metricas is not None:
+            render_diagnostics(metricas)
+        if config_final:
+            render_robustness(cronograma, config_final)
 
         with st.container(border=True):
             st.subheader("Cronograma Detalhado por Dia")
+            # Início, fim e setup de cada lote calculados uma vez para todos os dias
+            linha_do_tempo = timeline.build_timeline(cronograma, config_final)
+            linha_do_tempo['Data_de_Entrega'] = linha_do_tempo['Data_de_Entrega'].dt.strftime('%d/%m/%Y')
+            for coluna in ('Inicio', 'Fim'):
+                linha_do_tempo[coluna] = linha_do_tempo[coluna].dt.strftime('%d/%m/%Y %H:%M')
+            linha_do_tempo['Utilizacao_Acumulada'] = linha_do_tempo['Utilizacao_Acumulada'].round(3)
             tabs = st.tabs([f"Dia {i+1}" for i in range(len(cronograma))])
             for i, tab in enumerate(tabs):
                 with tab:
                     dia_data = cronograma[i]
-                    df_dia_original = pd.DataFrame(dia_data['items'])
-                    df_dia_para_exibicao = df_dia_original.copy()
-                    df_dia_para_exibicao['Data_de_Entrega'] = df_dia_para_exibicao['Data_de_Entrega'].dt.strftime('%d/%m/%Y')
+                    df_dia_para_exibicao = linha_do_tempo[linha_do_tempo['Dia'] == dia_data['day']]
+                    if 'lower_bound' in dia_data:
+                        st.caption(
+                            f"Sequenciador: {dia_data['solver']} | Setup: {dia_data['setup_cost']} min | "
+                            f"Limite inferior: {dia_data['lower_bound']} min | Gap de otimalidade: {dia_data['optimality_gap']:.1%}"
+                        )
                     st.dataframe(df_dia_para_exibicao, use_container_width=True)
                     output_csv = df_dia_para_exibicao.to_csv(sep=';', index=False, encoding='latin1').encode('latin1')
                     output_excel = io.BytesIO()